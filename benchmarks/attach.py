@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""Time Attach as the number of anchored glyphs grows.
+
+A synthetic font is made with N anchored glyphs, a fifth of them marks
+with a ``_top`` anchor and the rest bases with a ``top`` anchor, and
+``Attach &top &_top bases;`` is run twice (the second time with the glyph
+categories already cached). Up to --baseline-max glyphs, the collection
+loop Attach used to have, which refiltered everything it had collected
+for each anchored glyph, is timed for comparison.
+
+    python3 benchmarks/attach.py [--sizes 1000,5000,...] [--baseline-max N]
+"""
+import argparse
+import time
+
+from babelfont import Font, Glyph
+from fez import FezParser, set_cache_dir
+
+ATTACH = "Feature mark { Attach &top &_top bases; };"
+
+
+def make_parser(count):
+    font = Font()
+    anchors = {}
+    for i in range(count):
+        if i % 5:
+            name, category, anchor = "base%05i" % i, "base", "top"
+        else:
+            name, category, anchor = "mark%05i" % i, "mark", "_top"
+        font.glyphs.append(Glyph(name=name, category=category))
+        anchors[name] = {anchor: (i, 500)}
+    parser = FezParser(font)
+    parser.fontfeatures.anchors.update(anchors)
+    return parser
+
+
+def old_collect(parser, aFrom, aTo):
+    """Attach's collection loop before it was made linear."""
+    bases, marks, catcache = {}, {}, {}
+
+    def _category(k):
+        if k not in catcache:
+            catcache[k] = parser.fontfeatures.glyphclasses.get(k, parser.font.glyphs[k].category)
+        return catcache[k]
+
+    for k, v in parser.fontfeatures.anchors.items():
+        if aFrom in v:
+            bases[k] = v[aFrom]
+        if aTo in v:
+            marks[k] = v[aTo]
+        bases = {k: v for k, v in bases.items() if _category(k) == "base"}
+        marks = {k: v for k, v in marks.items() if _category(k) == "mark"}
+    return bases, marks
+
+
+def timed(f):
+    start = time.perf_counter()
+    f()
+    return time.perf_counter() - start
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argparser.add_argument("--sizes", default="1000,2000,5000,10000,20000,50000")
+    argparser.add_argument("--baseline-max", type=int, default=5000)
+    args = argparser.parse_args()
+
+    set_cache_dir(None)
+    print("%8s %10s %10s %10s" % ("glyphs", "first", "second", "old loop"))
+    for count in [int(n) for n in args.sizes.split(",")]:
+        parser = make_parser(count)
+        first = timed(lambda: parser.parseString(ATTACH))
+        second = timed(lambda: parser.parseString(ATTACH))
+        if count <= args.baseline_max:
+            old = "%9.3fs" % timed(lambda: old_collect(parser, "top", "_top"))
+        else:
+            old = "%10s" % "-"
+        print("%8i %9.3fs %9.3fs %s" % (count, first, second, old))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""Compare fez's binning with calling glyphtools.bin_glyphs_by_metric each time.
+
+Every glyph of the font is binned by several metrics and bin counts, and each
+binning is asked for --repeats times, as happens when several verbs bin the
+same class. Bins from the two engines are also compared.
+
+    python3 benchmarks/binning.py [FONT] [--runs N] [--repeats N]
+"""
+import argparse
+import os
+import statistics
+import time
+
+import numpy as np
+from babelfont import load
+from fez import FezParser, set_cache_dir
+
+here = os.path.dirname(os.path.abspath(__file__))
+default_font = os.path.join(here, "..", "tests", "data", "Roboto-Regular.ttf")
+
+METRICS = ["width", "rise", "lsb", "rsb"]
+BINCOUNTS = [3, 5, 8]
+
+# glyphtools' clustering still uses np.float_, which NumPy 2 removed.
+if not hasattr(np, "float_"):
+    np.float_ = np.float64
+from glyphtools import bin_glyphs_by_metric  # noqa: E402
+
+
+def jobs(repeats):
+    for _ in range(repeats):
+        for metric in METRICS:
+            for bincount in BINCOUNTS:
+                yield metric, bincount
+
+
+def run_glyphtools(font, glyphs, repeats):
+    start = time.perf_counter()
+    results = {}
+    for metric, bincount in jobs(repeats):
+        results[metric, bincount] = bin_glyphs_by_metric(font, glyphs, metric, bincount=bincount)
+    return time.perf_counter() - start, results
+
+
+def run_fez(font, glyphs, repeats):
+    parser = FezParser(font)
+    start = time.perf_counter()
+    results = {}
+    for metric, bincount in jobs(repeats):
+        results[metric, bincount] = parser.glyph_metrics.bin(glyphs, metric, bincount=bincount)
+    return time.perf_counter() - start, results
+
+
+def same_bins(a, b):
+    return [(tuple(glyphs), mean) for glyphs, mean in a] == list(b)
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argparser.add_argument("font", nargs="?", default=default_font)
+    argparser.add_argument("--runs", type=int, default=3)
+    argparser.add_argument("--repeats", type=int, default=3)
+    args = argparser.parse_args()
+
+    set_cache_dir(None)  # measure glyphs afresh, as glyphtools does
+    font = load(args.font)
+    glyphs = FezParser(font).glyph_index.names
+
+    baseline, fez = [], []
+    for _ in range(args.runs):
+        elapsed, expected = run_glyphtools(font, glyphs, args.repeats)
+        baseline.append(elapsed)
+        elapsed, got = run_fez(font, glyphs, args.repeats)
+        fez.append(elapsed)
+
+    binnings = len(METRICS) * len(BINCOUNTS) * args.repeats
+    print("%i glyphs, %i binnings" % (len(glyphs), binnings))
+    for label, times in (("glyphtools", baseline), ("fez", fez)):
+        print("%-10s %.3fs (median of %i)" % (label, statistics.median(times), args.runs))
+    print("speedup: %.2fx" % (statistics.median(baseline) / statistics.median(fez)))
+    differing = [key for key in expected if not same_bins(expected[key], got[key])]
+    print("binnings with different bins: %s" % (differing or "none"))
+
+
+if __name__ == "__main__":
+    main()
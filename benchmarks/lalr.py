@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""Compare Earley and LALR parsing speed over the files in fez-samples/.
+
+Only parsing is timed: every statement's arguments are parsed with its verb's
+grammar, but nothing is transformed, so the samples do not need their fonts.
+Verb trees from the two modes are also compared, ignoring whitespace tokens.
+
+    python3 benchmarks/lalr.py [FONT] [--runs N]
+"""
+import argparse
+import glob
+import os
+import statistics
+import time
+
+import lark
+from babelfont import load
+from fez import FezParser
+
+here = os.path.dirname(os.path.abspath(__file__))
+samples = sorted(glob.glob(os.path.join(here, "..", "fez-samples", "*.fez")))
+default_font = os.path.join(here, "..", "tests", "data", "LibertinusSans-Regular.otf")
+
+
+def normalise(tree):
+    """Drop whitespace tokens and join up glyph suffixes, which LALR lexes as one token."""
+    if not isinstance(tree, lark.Tree):
+        return tree
+    if tree.data == "glyphsuffix":
+        return (tree.data, "".join(tree.children))
+    return (tree.data, [normalise(c) for c in tree.children if not (isinstance(c, lark.Token) and c.type == "WS")])
+
+
+def parse_statements(parser, tree, out):
+    """Parse the arguments of each statement in a top-level tree with its verb's parser."""
+    for statement in tree.find_data("statement"):
+        verb = statement.children[0].children[0].value
+        if verb == "LoadPlugin":
+            try:
+                parser.load_plugin(statement.children[1].children[0].children[0].value)
+            except ImportError:
+                pass
+        if verb not in parser.plugins:
+            continue
+        plugin = parser.plugins[verb]
+        args = statement.children[1].children
+        idxs = [i for i, a in enumerate(args) if a.data == "statement"]
+        strings = lambda items: " ".join(a.children[0].value for a in items)
+        try:
+            if idxs:
+                out.append(plugin.bbparser.parse(strings(args[: idxs[0]])))
+                out.append(plugin.abparser.parse(strings(args[idxs[-1] + 1 :])))
+            else:
+                out.append(plugin.parser.parse(strings(args)))
+        except lark.exceptions.LarkError:
+            out.append(None)
+
+
+def parse_file(parser, text):
+    out = []
+    parse_statements(parser, parser.parser.parse(text), out)
+    return out
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argparser.add_argument("font", nargs="?", default=default_font)
+    argparser.add_argument("--runs", type=int, default=5)
+    args = argparser.parse_args()
+    font = load(args.font)
+
+    texts = {os.path.basename(f): open(f).read() for f in samples}
+    parsers = {"earley": FezParser(font, lalr=False), "lalr": FezParser(font, lalr=True)}
+    results, times = {}, {}
+    for mode, parser in parsers.items():
+        for name, text in texts.items():
+            try:
+                results[mode, name] = parse_file(parser, text)  # also warms up the parsers
+            except lark.exceptions.LarkError:
+                results[mode, name] = None
+        runs = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            for name, text in texts.items():
+                if results[mode, name] is not None:
+                    parse_file(parser, text)
+            runs.append(time.perf_counter() - start)
+        times[mode] = statistics.median(runs)
+
+    mismatches = [
+        name for name in texts
+        if [normalise(t) for t in results["earley", name] or []] != [normalise(t) for t in results["lalr", name] or []]
+    ]
+    print("earley %.3fs" % times["earley"])
+    print("lalr   %.3fs" % times["lalr"])
+    print("speedup %.2fx over %i files" % (times["earley"] / times["lalr"], len(texts)))
+    if mismatches:
+        print("files parsed differently: %s" % ", ".join(mismatches))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""Compare FEZ start-up and parsing time with a cold and a warm parser cache.
+
+Each run happens in a fresh interpreter, so that the numbers include
+everything a ``fez2fea`` invocation would pay for. A run parses a FEZ file
+using a dozen verbs, so that their grammars are loaded, and leaves out the
+pregenerated parsers shipped with FEZ, so that every grammar comes from the
+parser cache (or, without a cache, is loaded afresh).
+
+    python3 benchmarks/parser_cache.py [FONT] [--fez FILE] [--runs N]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+here = os.path.dirname(os.path.abspath(__file__))
+default_font = os.path.join(here, "..", "tests", "data", "LibertinusSans-Regular.otf")
+default_fez = os.path.join(here, "parser_cache.fez")
+
+RUN = """
+import sys
+import time
+import warnings
+from babelfont import load
+from fez import FezParser
+from fez.cache import ParserCache, default_cache_dir
+warnings.simplefilter("ignore")
+FezParser.cache = ParserCache(default_cache_dir())  # no pregenerated parsers
+font = load(sys.argv[1])
+start = time.perf_counter()
+FezParser(font).parseFile(sys.argv[2])
+print(time.perf_counter() - start, FezParser.cache.hits, FezParser.cache.misses)
+"""
+
+
+def run_once(font, fez, cache_dir):
+    env = dict(os.environ, FEZ_CACHE_DIR=cache_dir)
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", RUN, font, fez], env=env, check=True, capture_output=True, text=True
+    )
+    elapsed = time.perf_counter() - start
+    parsing, hits, misses = result.stdout.split()
+    return elapsed, float(parsing), int(hits), int(misses)
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argparser.add_argument("font", nargs="?", default=default_font)
+    argparser.add_argument("--fez", default=default_fez)
+    argparser.add_argument("--runs", type=int, default=5)
+    args = argparser.parse_args()
+
+    results = {"no cache": [], "cold": [], "warm": []}
+    for _ in range(args.runs):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            results["cold"].append(run_once(args.font, args.fez, cache_dir))
+            results["warm"].append(run_once(args.font, args.fez, cache_dir))
+        results["no cache"].append(run_once(args.font, args.fez, ""))
+
+    print("medians of %i runs; parsing is FezParser() and parseFile, without"
+          " interpreter start-up or loading the font" % args.runs)
+    print("%-9s %8s %8s %8s %8s" % ("", "total", "parsing", "cached", "loaded"))
+    medians = {}
+    for label, runs in results.items():
+        medians[label] = [statistics.median(run[i] for run in runs) for i in (0, 1)]
+        _, _, hits, misses = runs[0]
+        print("%-9s %7.3fs %7.3fs %8i %8i" % ((label,) + tuple(medians[label]) + (hits, misses)))
+    print("warm speedup over no cache: %.2fx total, %.2fx parsing" % tuple(
+        medians["no cache"][i] / medians["warm"][i] for i in (0, 1)
+    ))
+
+
+if __name__ == "__main__":
+    main()
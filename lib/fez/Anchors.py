@@ -17,7 +17,14 @@ for mark glyphs::
 
 If you don't want to define these anchors manually but instead are dealing with
 a source font file which contains anchor declarations, you can load the anchors
-automatically from the font by using the ``LoadAnchors;`` verb.
+automatically from the font by using the ``LoadAnchors;`` verb. In a font
+with several masters, any anchor coordinate which differs between masters is
+loaded as a variable value, and the rest as plain numbers.
+
+Anchors are kept in ``fontfeatures.anchors``, an ``AnchorStore``. Plugins
+may assign one glyph's anchors to another
+(``anchors["B"] = anchors["A"]``, as ``CopyAnchors`` does); this copies
+them, so later changes to the anchors of one glyph do not affect the other.
 
 Once all your anchors are defined, the ``Attach`` verb can be used to attach
 marks to bases::
@@ -63,6 +70,7 @@ anchors, and using an ``Attach`` statement like the following::
 """
 
 from . import FEZVerb, GlyphSelector
+from .anchorstore import glyphs_with_anchor
 import fontFeatures
 from fontTools.feaLib.variableScalar import VariableScalar
 
@@ -123,11 +131,10 @@ class Anchors(FEZVerb):
 class LoadAnchors(FEZVerb):
     def action(self, _):
         if len(self.parser.font.masters) == 1:
-            for glyphname in self.parser.font.exportedGlyphs():
+            for glyphname in self.parser.glyph_index.names:
                 self.load_anchor_single_master(glyphname)
         else:
-            for glyphname in self.parser.font.exportedGlyphs():
-                self.load_anchor_variable(glyphname)
+            self.load_anchors_variable()
 
     def load_anchor_single_master(self, glyphname):
         g = self.parser.font.default_master.get_glyph_layer(glyphname)
@@ -136,67 +143,138 @@ class LoadAnchors(FEZVerb):
                 self.parser.fontfeatures.anchors[glyphname] = {}
             self.parser.fontfeatures.anchors[glyphname][a.name] = (int(a.x), int(a.y))
 
-    def load_anchor_variable(self, glyphname):
-        for m in self.parser.font.masters:
-            g = m.get_glyph_layer(glyphname)
-            for a in g.anchors:
-                if glyphname not in self.parser.fontfeatures.anchors:
-                    self.parser.fontfeatures.anchors[glyphname] = {}
-                if a.name not in self.parser.fontfeatures.anchors[glyphname]:
-                    x = VariableScalar()
-                    x.axes = self.parser.font.axes
-                    y = VariableScalar()
-                    y.axes = self.parser.font.axes
-                    self.parser.fontfeatures.anchors[glyphname][a.name] = (x,y)
-                this_anchor = self.parser.fontfeatures.anchors[glyphname][a.name]
-                this_anchor[0].add_value(m.location, a.x)
-                this_anchor[1].add_value(m.location, a.y)
+    def load_anchors_variable(self):
+        """Load the anchors of every glyph from every master.
+
+        The positions are read in one sweep over the glyphs' layers into
+        arrays of shape (anchors, masters). Coordinates which are the same in
+        every master with a layer for the glyph are stored as integers, like
+        the anchors of a single master font; only the others are made into
+        ``VariableScalar`` objects.
+        """
+        import numpy as np
+
+        masters = list(self.parser.font.masters)
+        keys = []  # (glyph name, anchor name) of each row
+        key_glyphs = []  # the row in `has_layer` of each key's glyph
+        has_layer = []
+        rows, columns, xs, ys = [], [], [], []
+        for glyphname in self.parser.glyph_index.names:
+            layers = [master.get_glyph_layer(glyphname) for master in masters]
+            glyph_rows = {}
+            for i, layer in enumerate(layers):
+                if layer is None:
+                    continue
+                for a in layer.anchors:
+                    row = glyph_rows.get(a.name)
+                    if row is None:
+                        row = glyph_rows[a.name] = len(keys)
+                        keys.append((glyphname, a.name))
+                        key_glyphs.append(len(has_layer))
+                    rows.append(row)
+                    columns.append(i)
+                    xs.append(a.x)
+                    ys.append(a.y)
+            if glyph_rows:
+                has_layer.append([layer is not None for layer in layers])
+        if not keys:
+            return
+
+        x = np.full((len(keys), len(masters)), np.nan)
+        y = np.full((len(keys), len(masters)), np.nan)
+        x[rows, columns] = xs
+        y[rows, columns] = ys
+        present = ~np.isnan(x)
+        # An anchor missing from a master which has its glyph is left to vary.
+        complete = (present == np.array(has_layer, dtype=bool)[key_glyphs]).all(axis=1)
+        fixed_x = (complete & (np.nanmin(x, axis=1) == np.nanmax(x, axis=1))).tolist()
+        fixed_y = (complete & (np.nanmin(y, axis=1) == np.nanmax(y, axis=1))).tolist()
+
+        anchors = self.parser.fontfeatures.anchors
+        first_x = np.nanmax(x, axis=1).tolist()
+        first_y = np.nanmax(y, axis=1).tolist()
+        x, y, present = x.tolist(), y.tolist(), present.tolist()
+        locations = [m.location for m in masters]
+        last_glyph = None
+        for row, (glyphname, anchorname) in enumerate(keys):
+            position = (
+                _coordinate(first_x[row]) if fixed_x[row] else self._variable_scalar(locations, x[row], present[row]),
+                _coordinate(first_y[row]) if fixed_y[row] else self._variable_scalar(locations, y[row], present[row]),
+            )
+            if glyphname != last_glyph:
+                if glyphname not in anchors:
+                    anchors[glyphname] = {}
+                glyph_anchors, last_glyph = anchors[glyphname], glyphname
+            glyph_anchors[anchorname] = position
+
+    def _variable_scalar(self, locations, values, present):
+        scalar = VariableScalar()
+        scalar.axes = self.parser.font.axes
+        for location, value, here in zip(locations, values, present):
+            if here:
+                scalar.add_value(location, _coordinate(value))
+        return scalar
+
+
+def _coordinate(value):
+    # Whole-number coordinates as integers, fractional ones as they are
+    return int(value) if value.is_integer() else value
+
+
+class _Categories(dict):
+    """Glyph categories, looked up as they are asked for."""
+
+    def __init__(self, parser, key):
+        super().__init__()
+        self.parser = parser
+        self.key = key
+
+    def __missing__(self, glyphname):
+        category = self.parser.fontfeatures.glyphclasses.get(glyphname)
+        if category is None:
+            category = self.parser.font.glyphs[glyphname].category
+        self[glyphname] = category
+        return category
+
+
+def glyph_categories(parser):
+    """Return a dictionary of glyph categories shared by every ``Attach``
+    in the parser. It is replaced when ``SetCategory`` changes a category or
+    the glyph index is rebuilt."""
+    glyphclasses = parser.fontfeatures.glyphclasses
+    key = (getattr(glyphclasses, "generation", None), parser.glyph_index.generation)
+    categories = parser.fontfeatures.scratch.get("Attach.categories")
+    if categories is None or key[0] is None or categories.key != key:
+        categories = parser.fontfeatures.scratch["Attach.categories"] = _Categories(parser, key)
+    return categories
+
 
 class Attach(FEZVerb):
     def action(self, args):
         (aFrom, aTo, markClass, attachtype, languages) = args
 
-        bases = {}
-        marks = {}
-        catcache = {}
         if isinstance(attachtype, GlyphSelector):
-            glyph_filter = attachtype.resolve(self.parser.fontfeatures, self.parser.font)
+            glyph_filter = set(attachtype.resolve(self.parser.fontfeatures, self.parser.font))
         else:
             glyph_filter = None
-        def _category(k):
-            if k not in catcache:
-                catcache[k] = self.parser.fontfeatures.glyphclasses.get(k, self.parser.font.glyphs[k].category)
-            return catcache[k]
-
-        for k, v in self.parser.fontfeatures.anchors.items():
-            if aFrom in v:
-                bases[k] = v[aFrom]
-            if aTo in v:
-                marks[k] = v[aTo]
-            if glyph_filter:
-                bases = {
-                    k: v
-                    for k, v in bases.items()
-                    if k in glyph_filter
-                }
-            elif attachtype == "marks":
-                bases = {
-                    k: v
-                    for k, v in bases.items()
-                    if _category(k) == "mark"
-                }
-            else:
-                bases = {
-                    k: v
-                    for k, v in bases.items()
-                    if _category(k) == "base"
-                }
-            if attachtype != "cursive":
-                marks = {
-                    k: v
-                    for k, v in marks.items()
-                    if _category(k) == "mark"
-                }
+        categories = glyph_categories(self.parser)
+        base_category = "mark" if attachtype == "marks" else "base"
+
+        # One pass over the glyphs with anchors, filtering as we go. Glyphs
+        # are taken in the order of the anchors, not of the anchor index,
+        # which changes as anchors are redefined.
+        anchors = self.parser.fontfeatures.anchors
+        with_from = glyphs_with_anchor(anchors, aFrom)
+        with_to = glyphs_with_anchor(anchors, aTo)
+        bases = {}
+        marks = {}
+        for k in anchors:
+            if k in with_from:
+                if (k in glyph_filter) if glyph_filter else (categories[k] == base_category):
+                    bases[k] = with_from[k]
+            if k in with_to:
+                if attachtype == "cursive" or categories[k] == "mark":
+                    marks[k] = with_to[k]
         return [
             fontFeatures.Routine(
                 rules=[
@@ -223,7 +301,7 @@ class Attach(FEZVerb):
 
 class PropagateAnchors(FEZVerb):
     def action(self, _):
-        for glyphname in self.parser.font.exportedGlyphs():
+        for glyphname in self.parser.glyph_index.names:
             # This does a simple, first-come-first-served base component propagation
             g = self.parser.font.default_master.get_glyph_layer(glyphname)
             if not g.components:
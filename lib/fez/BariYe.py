@@ -61,18 +61,7 @@ threshold, any adjustments less than the threshold will be dropped. e.g.
 
 
 import fontFeatures
-from glyphtools import (
-    categorize_glyph,
-    get_glyph_metrics,
-    bin_glyphs_by_metric,
-    get_rise,
-    get_run
-)
-from fontFeatures.pathUtils import get_bezier_paths
-from beziers.line import Line
-from beziers.point import Point
 import warnings
-import beziers
 import itertools
 import math
 import statistics
@@ -121,6 +110,7 @@ class BYMoveDots(FEZVerb):
     def action(self, args):
         strategy, below_dots = args
         parser = self.parser
+        metrics = parser.glyph_metrics
         for c in ["inits", "medis", "bariye", "behs"]:
             if c not in parser.fontfeatures.namedClasses:
                 raise ValueError("Please define @%s class before calling" % c)
@@ -134,16 +124,16 @@ class BYMoveDots(FEZVerb):
         inits = parser.fontfeatures.namedClasses["inits"]
         behs = parser.fontfeatures.namedClasses["behs"]
         below_dots = below_dots.resolve(parser.fontfeatures, parser.font)
-        smallest_medi_width = max(failsafe_min_run, min([get_run(parser.font, g) for g in medis]))
+        smallest_medi_width = max(failsafe_min_run, min([metrics.value(g, "run") for g in medis]))
         smallest_init_beh_width = min(
-            [get_run(parser.font, g) for g in (set(behs) & set(inits))]
+            [metrics.value(g, "run") for g in (set(behs) & set(inits))]
         )
         smallest_init_beh = min(
             (set(behs) & set(inits)),
-            key=lambda g: get_run(parser.font, g),
+            key=lambda g: metrics.value(g, "run"),
         )
         warnings.warn("Smallest medi width is %i" % smallest_medi_width)
-        smallest_medi = min(medis, key=lambda g: get_run(parser.font, g))
+        smallest_medi = min(medis, key=lambda g: metrics.value(g, "run"))
 
 
         # Next, let's create a chain rule for all nukta sequences
@@ -173,8 +163,8 @@ class BYMoveDots(FEZVerb):
             warnings.warn("BariYe computation for %s" % bariye)
             entry_anchor = parser.fontfeatures.anchors[bariye]["entry"]
             bariye_tail = max(
-                -get_glyph_metrics(parser.font, bariye)["rsb"],
-                get_glyph_metrics(parser.font, bariye)["xMax"] - entry_anchor[0],
+                -metrics.value(bariye, "rsb"),
+                metrics.value(bariye, "xMax") - entry_anchor[0],
             )
             # bariye_tail += max(get_glyph_metrics(parser.font, dot)["width"] for dot in below_dots) / 2
             # # Increase tail by half the width of the widest nukta
@@ -204,10 +194,10 @@ class BYMoveDots(FEZVerb):
             # Second, the case where the init is not beh, but there are a bunch of medis,
             # one (or more) of which is a medi beh
             smallest_init_nonbeh_width = min(
-                [max(get_rise(parser.font, g),failsafe_min_run) for g in (set(inits) - set(behs))]
+                [max(metrics.value(g, "rise"),failsafe_min_run) for g in (set(inits) - set(behs))]
             )
             smallest_medi_beh_width = min(
-                [max(get_rise(parser.font, g),failsafe_min_run) for g in (set(medis) & set(behs))]
+                [max(metrics.value(g, "rise"),failsafe_min_run) for g in (set(medis) & set(behs))]
             )
 
             maximum_sequence_length_2 = 2 + math.ceil(
@@ -223,12 +213,8 @@ class BYMoveDots(FEZVerb):
             maybeDropDotRoutine = fontFeatures.Routine(flags=0x0010)
             maybeDropDotRoutine.markFilteringSet = below_dots
 
-            binned_medis = bin_glyphs_by_metric(
-                parser.font, medis, "run", bincount=accuracy1
-            )
-            binned_inits = bin_glyphs_by_metric(
-                parser.font, inits, "run", bincount=accuracy1
-            )
+            binned_medis = metrics.bin(medis, "run", bincount=accuracy1)
+            binned_inits = metrics.bin(inits, "run", bincount=accuracy1)
 
             queue = [[[[bariye]]]]
             bin2mk = {"0": None, "1": below_dots}
@@ -266,10 +252,8 @@ class BYMoveDots(FEZVerb):
 
             if not alwaysDrop:
                 # Check to see if it can fit in the gap, and only move it if it can't
-                medis_by_rise = bin_glyphs_by_metric(
-                    parser.font, medis, "rise", bincount=accuracy2
-                )
-                queue = [[[[bariye], get_glyph_metrics(parser.font, bariye)["rise"]]]]
+                medis_by_rise = metrics.bin(medis, "rise", bincount=accuracy2)
+                queue = [[[[bariye], metrics.value(bariye, "rise")]]]
                 ybClearance = self.get_yb_clearance(parser, bariye)
                 gapRequired = self.compute_threshold(parser, below_dots) - ybClearance
                 warnings.warn(
@@ -304,11 +288,15 @@ class BYMoveDots(FEZVerb):
         return routines
 
     def get_yb_clearance(self, parser, bariye):
+        from fontFeatures.pathUtils import get_bezier_paths
+        from beziers.line import Line
+        from beziers.point import Point
+
         font = parser.font
         paths = get_bezier_paths(font, bariye)
         path = paths[0]
         bounds = path.bounds()
-        x_of_tail = get_rise(font, bariye)
+        x_of_tail = parser.glyph_metrics.value(bariye, "rise")
         ray = Line(
             Point(x_of_tail - 0.1, bounds.bottom - 5),
             Point(x_of_tail + 0.1, bounds.top + 5),
@@ -330,14 +318,15 @@ class BYMoveDots(FEZVerb):
         from fontFeatures.ttLib import unparse
 
         font = parser.font
+        metrics = parser.glyph_metrics
         behforms = list(
             filter(
                 lambda g: g.startswith("BEm") or g.startswith("BEi"),
-                parser.font.exportedGlyphs(),
+                parser.glyph_index.names,
             )
         )
         bottomOfDot = statistics.mean(
-            [get_glyph_metrics(font, x)["yMin"] for x in below_dots]
+            [metrics.value(x, "yMin") for x in below_dots]
         )
 
         if hasattr(parser.fontfeatures, "anchors"):
@@ -388,6 +377,7 @@ class BYFixOverhang(FEZVerb):
             adjustment_threshold = None
         overhang_padding = overhang_padding.resolve_as_integer()
         parser = self.parser
+        metrics = parser.glyph_metrics
         for c in ["inits", "medis"]:
             if c not in parser.fontfeatures.namedClasses:
                 raise ValueError("Please define @%s class before calling" % c)
@@ -396,16 +386,16 @@ class BYFixOverhang(FEZVerb):
         inits = parser.fontfeatures.namedClasses["inits"]
         overhangers = glyphs.resolve(parser.fontfeatures, parser.font)
 
-        binned_medis = bin_glyphs_by_metric(parser.font, medis, "run", bincount=8)
-        binned_inits = bin_glyphs_by_metric(parser.font, inits, "run", bincount=8)
+        binned_medis = metrics.bin(medis, "run", bincount=8)
+        binned_inits = metrics.bin(inits, "run", bincount=8)
         rules = []
         maxchainlength = 0
         longeststring = []
         for yb in overhangers:
             entry_anchor = parser.fontfeatures.anchors[yb]["entry"]
             overhang = max(
-                -get_glyph_metrics(parser.font, yb)["rsb"],
-                get_glyph_metrics(parser.font, yb)["xMax"] - entry_anchor[0],
+                -metrics.value(yb, "rsb"),
+                metrics.value(yb, "xMax") - entry_anchor[0],
             )
 
             workqueue = [[x] for x in binned_inits]
@@ -64,6 +64,16 @@ These predicates are followed by a comparison operator (``>=``, ``<=``, ``=``, `
 
     DefineClass @overhands = rsb < 0;
 
+In a font with several masters, metric predicates test the default master.
+To test other masters, wrap the comparison in ``anymaster(...)`` (true if the
+comparison holds in at least one master), ``allmasters(...)`` (true if it
+holds in every master) or ``master(name, ...)`` (a particular master, given
+by name or by number counting from zero)::
+
+    # Glyphs which stay narrow even in the boldest master
+    DefineClass @narrow = allmasters(width < 400);
+    DefineClass @bold_overhangs = master(Bold, rsb < 0);
+
 Alternatively, instead of an integer, you may supply a metric name and the name
 of a single glyph in brackets. For example, the following definition selects
 all members of the glyph class ``@alpha`` whose advance width is less than the
@@ -137,11 +147,20 @@ close bracket, like so::
 This will create five classes, called ``@bases_width1`` .. ``@bases_width5``,
 grouped in increasing order of advance width.
 
+In a font with several masters, glyphs are binned by their metrics in the
+default master. A third value in the brackets chooses another master by
+name, or ``max`` or ``min`` to bin each glyph by its largest or smallest
+value in any master - for example, its width in the widest master::
+
+    DefineClassBinned @bases[width,5,max] = @bases;
+
 Note that the size of the bins is not guaranteed to be equal, but bins are "smart":
 glyphs are clustered according to the similarity of their metric. For example, if
 the advance widths are 99, 100, 110, 120, 500, and 510 and two bins are created,
 one bin will contain four glyphs (those with widths 99-120) and the other bin
 will contain two glyphs (those with widths 500-510).
+Glyphs with the same value are always put in the same bin, so if there are
+fewer distinct values than bins, fewer classes are created.
 
 (This is just an example for the purpose of explaining binning. We'll show a
 better way to handle the i-matra question later.)
@@ -157,12 +176,12 @@ will take any glyph selector and display its contents on standard error.
 """
 
 import lark
-import re
-from glyphtools import bin_glyphs_by_metric
 
 import warnings
 
 from . import FEZVerb
+from .anchorstore import glyphs_with_anchor
+from .glyphindex import GlyphClass, compile_regex
 from .util import compare
 from fez import GlyphSelector
 
@@ -170,7 +189,10 @@ GRAMMAR = """
 has_glyph_predicate: "hasglyph(" REGEX MIDGLYPHNAME* ")"
 has_anchor_predicate: "hasanchor(" BARENAME ")"
 category_predicate: "category(" BARENAME ")"
-predicate: has_glyph_predicate | has_anchor_predicate | category_predicate | metric_comparison
+master_predicate: "anymaster(" metric_comparison ")" -> any_master_predicate
+                | "allmasters(" metric_comparison ")" -> all_masters_predicate
+                | "master(" (BARENAME | NUMBER) "," metric_comparison ")" -> one_master_predicate
+predicate: has_glyph_predicate | has_anchor_predicate | category_predicate | metric_comparison | master_predicate
 negated_predicate: "not" predicate
 
 CONJUNCTOR: "&" | "|" | "-"
@@ -187,7 +209,7 @@ action: classname "=" primary
 
 DefineClassBinned_GRAMMAR = """
 ?start: action
-action: classname "[" METRIC "," NUMBER "]" "=" primary
+action: classname "[" METRIC "," NUMBER ("," BARENAME)? "]" "=" primary
 """
 
 PARSEOPTS = dict(use_helpers=True)
@@ -195,27 +217,79 @@ VERBS = ["DefineClass", "DefineClassBinned"]
 
 class DefineClass(FEZVerb):
     def _add_glyphs_to_named_class(self, glyphs, classname):
+        if isinstance(glyphs, GlyphClass):
+            glyphs = glyphs.names
         self.parser.fontfeatures.namedClasses[classname] = glyphs
 
     def has_glyph_predicate(self, args):
         (glyphre, withs) = args[0], "".join([a.value for a in args[1:]])
-        value = {"replace": re.compile(glyphre.value[1:-1]), "with": withs}
-        return {"predicate": "hasglyph", "value": value, "inverted": False}
+        regex = glyphre.value[1:-1]
+        compile_regex(regex)  # report a bad regex when it is parsed
+
+        def evaluate(parser):
+            import numpy as np
+
+            index = parser.glyph_index
+            return np.fromiter(
+                map(index.name_set.__contains__, index.substitute(regex, withs)),
+                dtype=bool,
+                count=len(index.names),
+            )
+
+        return evaluate
 
     def has_anchor_predicate(self, args):
         (barename,) = args
-        return {"predicate": "hasanchor", "value": barename.value, "inverted": False}
+        anchor = barename.value
+
+        def evaluate(parser):
+            import numpy as np
+
+            ids = parser.glyph_index.ids
+            mask = np.zeros(len(ids), dtype=bool)
+            glyphs = glyphs_with_anchor(parser.fontfeatures.anchors, anchor)
+            mask[[ids[g] for g in glyphs if g in ids]] = True
+            return mask
+
+        return evaluate
 
     def category_predicate(self, args):
         (barename,) = args
         return {"predicate": "category", "value": barename.value, "inverted": False}
 
+    # Predicates are compiled into functions which take the parser and
+    # return a NumPy boolean array with one entry per glyph in the index.
+
     def metric_comparison(self, args):
         (metric, comparator, comp_value) = args
         metric = metric.value
         comparator = comparator.value
         comp_value = comp_value.resolve_as_integer()
-        return lambda metrics, glyphname: compare(metrics[metric], comparator, comp_value)
+
+        def evaluate(parser, master=None, quantifier=None):
+            table = parser.glyph_metrics
+            if quantifier is None:
+                return compare(table.column(metric, master), comparator, comp_value)
+            return quantifier(compare(table.master_columns(metric), comparator, comp_value), axis=0)
+
+        return evaluate
+
+    def any_master_predicate(self, args):
+        import numpy as np
+
+        (comparison,) = args
+        return lambda parser: comparison(parser, quantifier=np.any)
+
+    def all_masters_predicate(self, args):
+        import numpy as np
+
+        (comparison,) = args
+        return lambda parser: comparison(parser, quantifier=np.all)
+
+    def one_master_predicate(self, args):
+        (master, comparison) = args
+        master = int(master.value) if master.type == "NUMBER" else master.value
+        return lambda parser: comparison(parser, master=master)
 
     def predicate(self, args):
         (predicate,) = args
@@ -223,11 +297,11 @@ class DefineClass(FEZVerb):
         if callable(predicate): # if it's a comparison
             return predicate
         else:
-            return lambda _, glyphname: self.meets_predicate(glyphname, predicate, self.parser)
+            return lambda parser: self.predicate_mask(predicate, parser)
 
     def negated_predicate(self, args):
         (predicate,) = args
-        return lambda metrics, glyphname: not predicate(metrics, glyphname)
+        return lambda parser: ~predicate(parser)
 
     def primary_action(self, args):
         return args[0]
@@ -242,15 +316,13 @@ class DefineClass(FEZVerb):
             return glyphs
 
     def _predicate_for_all_glyphs(self, predicate):
-        all_glyphs = list(self.parser.font.exportedGlyphs())
-        return [g for g in all_glyphs if predicate(self._get_metrics(g), g)]
+        import numpy as np
+
+        mask = np.packbits(predicate(self.parser), bitorder="little")
+        return GlyphClass(self.parser.glyph_index, int.from_bytes(mask.tobytes(), "little"))
 
     def conjunction(self, args):
         l, conjunctor, r = args
-
-        if isinstance(l, list) and callable(r):
-            return [g for g in l if r(self._get_metrics(g), g)]
-
         return {"conjunction": {"&":"and","|":"or","-":"subtract"}[conjunctor], "left": l, "right": r}
 
     def action(self, args):
@@ -264,28 +336,37 @@ class DefineClass(FEZVerb):
     @classmethod
     def resolve_definition(self, parser, primary):
         if isinstance(primary, dict) and "conjunction" in primary:
-            left = set(primary["left"])
-            right = set(primary["right"])
+            # Resolved selectors only hold glyphs in the index, so both
+            # sides can be combined as bitmasks of glyph IDs.
+            index = parser.glyph_index
+            left = GlyphClass.from_names(index, primary["left"])
+            right = GlyphClass.from_names(index, primary["right"])
             if primary["conjunction"] == "or":
-                return list(left | right)
+                return left | right
             elif primary["conjunction"] == "and":
-                return list(left & right)
+                return left & right
             else: #subtract
-                return set(left) - set(right)
+                return left - right
         else:
             return primary.resolve(parser.fontfeatures, parser.font)
 
+    @classmethod
+    def predicate_mask(self, predicate, parser):
+        import numpy as np
+
+        names = parser.glyph_index.names
+        return np.fromiter(
+            (self.meets_predicate(g, predicate, parser) for g in names),
+            dtype=bool,
+            count=len(names),
+        )
+
     @classmethod
     def meets_predicate(self, glyphname, predicate, parser):
         metric = predicate["predicate"]
-        if metric == "hasanchor":
-            anchor = predicate["value"]
-            truth = glyphname in parser.fontfeatures.anchors and anchor in parser.fontfeatures.anchors[glyphname]
-        elif metric == "category":
+        if metric == "category":
             cat = predicate["value"]
             truth = parser.font.glyphs[glyphname].category == cat
-        elif metric == "hasglyph":
-            truth = re.sub(predicate["value"]["replace"], predicate["value"]["with"], glyphname) in parser.font.exportedGlyphs()
         else:
             raise ValueError("Unknown metric {}".format(metric))
         return truth
@@ -293,23 +374,15 @@ class DefineClass(FEZVerb):
 class DefineClassBinned(DefineClass):
     def action(self, args):
         # glyphs is already resolved, because this class has functions of DefineClass, which resolves `primary`
-        classname, (metric, bincount), glyphs = args[0], (args[1].value, args[2].value), args[3]
-        binned = bin_glyphs_by_metric(self.parser.font, glyphs, metric, bincount=int(bincount))
-        for i in range(1, int(bincount) + 1):
-            self.parser.fontfeatures.namedClasses["%s_%s%i" % (classname, metric, i)] = tuple(binned[i - 1][0])
+        classname, (metric, bincount), glyphs = args[0], (args[1].value, args[2].value), args[-1]
+        master = args[3].value if len(args) == 5 else None
+        if isinstance(glyphs, GlyphClass):
+            glyphs = glyphs.names
+        binned = self.parser.glyph_metrics.bin(glyphs, metric, bincount=int(bincount), master=master)
+        # Glyphs with fewer distinct values than bins fill fewer bins, but
+        # every class is defined, so later statements can refer to them.
+        for i in range(int(bincount)):
+            binglyphs = binned[i][0] if i < len(binned) else ()
+            self.parser.fontfeatures.namedClasses["%s_%s%i" % (classname, metric, i + 1)] = tuple(binglyphs)
 
         return classname, (metric, bincount), glyphs
-
-"""
-class DefineClassBinned(DefineClass):
-    @classmethod
-    def action(self, parser, metric, bincount, classname, definition):
-        glyphs = self.resolve_definition(parser, definition[0])
-        predicates = definition[1]
-        for p in predicates:
-            glyphs = list(filter(lambda x: self.meets_predicate(x, p, parser), glyphs))
-
-        binned = bin_glyphs_by_metric(parser.font, glyphs, metric, bincount=int(bincount))
-        for i in range(1, int(bincount) + 1):
-            parser.fontfeatures.namedClasses["%s_%s%i" % (classname["classname"], metric, i)] = tuple(binned[i - 1][0])
-"""
@@ -69,7 +69,8 @@ VERBS = ["SetWidth", "SetCategory"]
 
 class SetWidth(FEZVerb):
     def action(self, args):
-        (glyphs, width, is_relative) = args
+        (glyphs, width, *is_relative) = args
+        width = width.resolve_as_integer()
         for g in glyphs.resolve(self.parser.fontfeatures, self.parser.font):
             glyph = self.parser.font.default_master.get_glyph_layer(g)
             if is_relative:
@@ -88,7 +89,7 @@ class DuplicateGlyphs:
                 "Length of new glyphs should be the same as old glyphs"
             )
         for o,n in zip(oldglyphs, newglyphs):
-            if n in self.parser.glyphs:
+            if n in self.parser.glyph_index:
                 warnings.warn("Glyph '%s' already exists" % n)
                 continue
             oldglyph = parser.font.glyphs[o]
@@ -98,7 +99,6 @@ class DuplicateGlyphs:
             parser.font.glyphs.append(newglyph)
             # XXX mark attachment class
             self.parser.font_modified = True
-        self.parser.glyphs = list(parser.font.glyphs)
         return []
 
 class SetCategory(FEZVerb):
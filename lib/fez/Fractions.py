@@ -50,7 +50,6 @@ For this to work:
 
 import fontFeatures
 from fez import FEZVerb
-from glyphtools import bin_glyphs_by_metric, get_glyph_metrics
 from itertools import product
 
 PARSEOPTS = dict(use_helpers=True)
@@ -80,7 +79,7 @@ class Fractions(FEZVerb):
                 binned_glyphs = self.binned_denominator
                 kwargs = {"precontext": context}
 
-            slash_width = get_glyph_metrics(self.parser.font, self.fraction[0])["width"]
+            slash_width = self.parser.glyph_metrics.value(self.fraction[0], "width")
             slash_width = slash_width * slash_count - overlap * (slash_count - 1)
 
             for things in product(*([binned_glyphs] * count)):
@@ -108,11 +107,11 @@ class Fractions(FEZVerb):
         assert len(fraction) == 1
         self.fraction = fraction
 
-        self.binned_numerator = bin_glyphs_by_metric(
-            self.parser.font, numerator, "width", BIN_COUNT
+        self.binned_numerator = self.parser.glyph_metrics.bin(
+            numerator, "width", BIN_COUNT
         )
-        self.binned_denominator = bin_glyphs_by_metric(
-            self.parser.font, denominator, "width", BIN_COUNT
+        self.binned_denominator = self.parser.glyph_metrics.bin(
+            denominator, "width", BIN_COUNT
         )
         self.rules = []
 
@@ -28,10 +28,7 @@ XXX This module needs to be updated to use the new shaping engine.
 """
 
 import fontFeatures
-from fontFeatures.jankyPOS import JankyPos
-import collidoscope
 import warnings
-import beziers
 import itertools
 from functools import reduce
 
@@ -48,6 +45,10 @@ VERBS = ["IfCollides"]
 
 class IfCollides(FEZVerb):
     def action(self, args):
+        from fontFeatures.jankyPOS import JankyPos
+        import collidoscope
+        import beziers
+
         parser = self.parser
         sequence = args[:-1]
         routine = args[-1]
@@ -56,7 +57,7 @@ class IfCollides(FEZVerb):
         if len(named) != 1:
             raise ValueError("Could not find routine called %s" % routine)
         routine = named[0]
-        janky = fontFeatures.jankyPOS.JankyPos(parser.font, direction="RTL")
+        janky = JankyPos(parser.font, direction="RTL")
         col = collidoscope.Collidoscope(
             None, {"cursive": False, "faraway": True, "area": 0.1}, ttFont=parser.font,
         )
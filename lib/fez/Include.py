@@ -6,6 +6,10 @@ FEZ files may contain other files; to load another file, use the ``Include``
 verb::
 
     Include anchors.fez;
+
+Included files are parsed once and their parse trees cached (in memory, and
+on disk if a cache directory is given; see ``fez.cache``), so a file shared
+between many fonts is only read and parsed again when it changes.
 """
 
 from . import FEZVerb
@@ -20,16 +24,19 @@ action: ESCAPED_STRING
 """
 VERBS = ["Include", "IncludeFEA"]
 
-def _file_to_string_or_error(parser, filename):
+def _resolve_or_error(parser, filename):
     # Try it relative to current file
     basedir = os.path.dirname(parser.current_file)
     trypath = os.path.join(basedir, filename)
     for p in [trypath, filename]:
         if os.path.exists(p):
-            with open(p) as f:
-                return f.read()
+            return os.path.realpath(p)
     raise ValueError("Could not include file %s" % filename)
 
+def _file_to_string_or_error(parser, filename):
+    with open(_resolve_or_error(parser, filename)) as f:
+        return f.read()
+
 class Include(FEZVerb):
     immediate = True
     
@@ -38,7 +45,9 @@ class Include(FEZVerb):
 
     def action(self, args):
         (filename,) = args
-        return self.parser.parseString(_file_to_string_or_error(self.parser, filename))
+        path = _resolve_or_error(self.parser, filename)
+        tree = self.parser.include_cache.tree(path, self.parser.grammar_key, self.parser.parseTree)
+        return self.parser.transformTree(tree)
 
 from fontFeatures.feaLib import FeaParser
 
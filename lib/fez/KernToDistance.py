@@ -1,7 +1,6 @@
 # This is a good idea but needs a bit of rethinking.
 
 from fez import FEZVerb
-from glyphtools import determine_kern, bin_glyphs_by_metric
 import fontFeatures
 import itertools
 from fez.util import extend_args_until
@@ -35,6 +34,8 @@ class KernToDistance(FEZVerb):
         return args
 
     def action(self, args):
+        from glyphtools import determine_kern
+
         parser = self.parser
         bincount = 5
         lefts, rights, units, pre = args[0]
@@ -65,7 +66,7 @@ class KernToDistance(FEZVerb):
 
         kerns = []
         binned_contexts = [
-            bin_glyphs_by_metric(parser.font, glyphs, "rise", bincount=bincount)
+            parser.glyph_metrics.bin(glyphs, "rise", bincount=bincount)
             for glyphs in pre
         ]
         for c in itertools.product(*binned_contexts):
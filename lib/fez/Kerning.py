@@ -69,8 +69,8 @@ class Kerning(FEZVerb):
             else:
                 r = [r]
 
-            l = [ g for g in l if g in self.parser.font.exportedGlyphs()]
-            r = [ g for g in r if g in self.parser.font.exportedGlyphs()]
+            l = [ g for g in l if g in self.parser.glyph_index]
+            r = [ g for g in r if g in self.parser.glyph_index]
             for l1 in l:
                 for r1 in r:
                     rules.append(fontFeatures.Positioning(
@@ -38,7 +38,6 @@ This is most helpful when combined with the ``For`` loop.
 
 from . import FEZVerb
 import lark
-from glyphtools import get_glyph_metrics, bin_glyphs_by_metric
 from . import TESTVALUE_METRICS
 
 PARSEOPTS = dict(use_helpers=True)
@@ -1,16 +1,25 @@
 import lark
 
 import collections
+import functools
+import os
 import pathlib
+import pickle
 import re
 import warnings
 
 from importlib import import_module
-from fontFeatures import FontFeatures
-from more_itertools import collapse
-from fontTools.feaLib.variableScalar import VariableScalar
 from lark.visitors import VisitError
-from glyphtools import get_glyph_metrics
+from lark.load_grammar import GrammarBuilder
+
+# fontFeatures, glyphtools and fontTools.feaLib.variableScalar pull in numpy
+# and much of fontTools, so they are imported where they are used rather
+# than here; see tests/test_import_time.py.
+
+from .anchorstore import AnchorStore
+from .glyphindex import glyph_index
+from .selectorcache import GenerationDict, NamedClasses
+from .cache import MISSING, MetricsCache, ParserCache, PregeneratedParsers, REGISTRY, TreeCache, default_cache_dir, grammar_digest
 
 
 def warning_on_one_line(message, category, filename, lineno, file=None, line=None):
@@ -41,7 +50,8 @@ class GlyphSelector:
         elif "unicodeglyph" in self.selector:
             returned = "U+%04X" % self.selector["unicodeglyph"]
         elif "unicoderange" in self.selector:
-            returned = "U+%04X=>U+%04X" % self.selector["unicoderange"].start, self.selector["unicoderange"].stop
+            codepoints = self.selector["unicoderange"]
+            returned = "U+%04X=>U+%04X" % (codepoints[0], codepoints[-1])
         elif "inlineclass" in self.selector:
             items = [
                 GlyphSelector(i, (), self.location)
@@ -55,25 +65,64 @@ class GlyphSelector:
             returned = returned + s["suffixtype"] + s["suffix"]
         return returned
 
-    def _apply_suffix(self, glyphname, suffix):
-        if suffix["suffixtype"] == ".":
-            glyphname = glyphname + "." + suffix["suffix"]
-        else:
-            if glyphname.endswith("." + suffix["suffix"]):
-                glyphname = glyphname[: -(len(suffix["suffix"]) + 1)]
-        return glyphname
+    def _variable_generations(self, selector=None):
+        """Return the generations of the variables this selector uses, or
+        ``None`` if any of them cannot be tracked."""
+        selector = selector or self.selector
+        if "variable" in selector:
+            variables = selector["variable"].parser.variables
+            if not isinstance(variables, GenerationDict):
+                return None
+            return (variables.generation,)
+        if "inlineclass" in selector:
+            generations = ()
+            for item in selector["inlineclass"]:
+                item_generations = self._variable_generations(item)
+                if item_generations is None:
+                    return None
+                generations += item_generations
+            return generations
+        return ()
 
     def resolve(self, fontfeatures, font, mustExist=True):
+        """Return a list of the glyph names this selector stands for.
+
+        Results are cached against the named classes of ``fontfeatures``
+        when these are a ``NamedClasses`` dictionary; see ``fez.selectorcache``.
+        """
+        classes = fontfeatures.namedClasses
+        generations = self._variable_generations()
+        if isinstance(classes, NamedClasses) and generations is not None:
+            index = glyph_index(font)
+            key = (self.as_text(), mustExist, index.generation, generations)
+            returned, notFound = classes.selector_cache.get(
+                key, lambda: self._resolve(fontfeatures, font, mustExist), index
+            )
+        else:
+            returned, notFound = self._resolve(fontfeatures, font, mustExist)
+        if notFound:
+            plural = ""
+            if len(notFound) > 1:
+                plural = "s"
+            glyphstring = ", ".join(notFound)
+            warnings.warn(
+                "# Couldn't find glyph%s '%s' in font (%s at %s)"
+                % (plural, glyphstring, self.as_text(), self.location)
+            )
+        return list(returned)
+
+    def _resolve(self, fontfeatures, font, mustExist):
+        from more_itertools import collapse
         returned = []
         # assert isinstance(font, Font)
-        glyphs = font.exportedGlyphs()
+        glyphs = glyph_index(font)
         if "variable" in self.selector:
             returned = [self.selector["variable"].resolve_as_glyph()]
         elif "barename" in self.selector:
             returned = [self.selector["barename"]]
         elif "unicodeglyph" in self.selector:
             cp = self.selector["unicodeglyph"]
-            glyph = font.unicode_map.get(cp, None)
+            glyph = glyphs.cmap.get(cp, None)
             if not glyph:
                 if not mustExist:
                     returned = []
@@ -85,18 +134,12 @@ class GlyphSelector:
             else:
                 returned = [glyph]
         elif "unicoderange" in self.selector:
-            returned = list(
-                collapse(
-                    [
-                        GlyphSelector({"unicodeglyph": i}, (), self.location).resolve(fontfeatures, font, mustExist=False)
-                        for i in self.selector["unicoderange"]
-                    ]
-                )
-            )
+            codepoints = self.selector["unicoderange"]
+            returned = glyphs.unicode_range(codepoints[0], codepoints[-1])
             if not returned and mustExist:
                 raise ValueError(
                     "Font does not contain any glyphs for U+%04X-U+%04X (at %s)"
-                    % (self.selector["unicoderange"][0], self.selector["unicoderange"][-1], self.location)
+                    % (codepoints[0], codepoints[-1], self.location)
                 )
         elif "inlineclass" in self.selector:
             returned = list(
@@ -118,29 +161,19 @@ class GlyphSelector:
         elif "regex" in self.selector:
             regex = self.selector["regex"]
             try:
-                pattern = re.compile(regex)
+                returned = glyphs.match(regex)
             except Exception as e:
                 raise ValueError(
                     "Couldn't parse regular expression '%s' at %s"
                     % (regex, self.location)
                 )
-
-            returned = list(filter(lambda x: re.search(pattern, x), glyphs))
         for s in self.suffixes:
-            returned = [self._apply_suffix(g, s) for g in returned]
+            returned = glyphs.apply_suffix(returned, s["suffixtype"], s["suffix"])
+        notFound = ()
         if mustExist:
-            notFound = list(filter(lambda x: x not in glyphs, returned))
-            returned = list(filter(lambda x: x in glyphs, returned))
-            if len(notFound) > 0:
-                plural = ""
-                if len(notFound) > 1:
-                    plural = "s"
-                glyphstring = ", ".join(notFound)
-                warnings.warn(
-                    "# Couldn't find glyph%s '%s' in font (%s at %s)"
-                    % (plural, glyphstring, self.as_text(), self.location)
-                )
-        return list(returned)
+            notFound = tuple(x for x in returned if x not in glyphs)
+            returned = [x for x in returned if x in glyphs]
+        return tuple(returned), notFound
 
 
 class ScalarOrVariable:
@@ -155,9 +188,11 @@ class ScalarOrVariable:
         if isinstance(self.token, lark.Token):
             assert self.token.type == "VARIABLE"
         else:
+            from fontTools.feaLib.variableScalar import VariableScalar
             assert isinstance(self.token, (int, float, VariableScalar))
 
     def resolve_as_bool(self):
+        from fontTools.feaLib.variableScalar import VariableScalar
         if isinstance(self.token, VariableScalar):
             self.token.values[k] = v.resolve_as_integer()
             return any(bool(x) for x in self.token.values.values())
@@ -172,7 +207,7 @@ class ScalarOrVariable:
         value = self.parser.variables[name]
 
         if self.metric:
-            return bool(get_glyph_metrics(self.parser.font, value)[self.metric])
+            return bool(self.parser.glyph_metrics.value(value, self.metric))
 
         if isinstance(value, ScalarOrVariable): # Of course variables can also point to variables
             return value.resolve_as_bool()
@@ -181,6 +216,7 @@ class ScalarOrVariable:
 
 
     def resolve_as_integer(self):
+        from fontTools.feaLib.variableScalar import VariableScalar
         if isinstance(self.token, VariableScalar):
             for k,v in self.token.values.items():
                 self.token.values[k] = v.resolve_as_integer()
@@ -197,7 +233,7 @@ class ScalarOrVariable:
         value = self.parser.variables[name]
 
         if self.metric:
-            return get_glyph_metrics(self.parser.font, value)[self.metric]
+            return self.parser.glyph_metrics.value(value, self.metric)
 
         if isinstance(value, ScalarOrVariable): # Of course variables can also point to variables
             return value.resolve_as_integer()
@@ -239,15 +275,17 @@ GRAMMAR="""
 
 TESTVALUE_METRICS=["width", "lsb", "rsb", "xMin", "xMax", "yMin", "yMax", "rise", "run", "fullwidth"]
 
-HELPERS="""
+STATEMENT_HELPERS="""
     statement: verb args ";"
     verb: VERB
-    args: arg* | (arg* "{{" statement* "}}" arg*)
+    args: arg* | (arg* "{" statement* "}" arg*)
     arg: ARG WS*
 
     VERB: /[A-Z]/ (LETTER | DIGIT | "_")+
     ARG: (/[^\\s;]+/)
+"""
 
+ARGUMENT_HELPERS="""
     STARTGLYPHNAME: LETTER | DIGIT | "_"
     MIDGLYPHNAME: STARTGLYPHNAME | "." | "-"
     BARENAME: STARTGLYPHNAME MIDGLYPHNAME*
@@ -300,6 +338,26 @@ HELPERS="""
     %ignore WS
 """.format(" | ".join(['"{}"'.format(tv) for tv in TESTVALUE_METRICS]))
 
+HELPERS = STATEMENT_HELPERS + ARGUMENT_HELPERS
+
+# In single-pass mode, every verb's grammar is added to this one, and known
+# verbs are parsed straight into their own rules rather than into ``args``.
+SINGLE_PASS_GRAMMAR="""
+    ?start: statement+
+    statement: {verbs}verb args ";"
+    verb: VERB
+    args: arg* | (arg* "{{" statement* "}}" arg*)
+    arg: ARG WS*
+
+    VERB: /(?!(?:{names})(?![A-Za-z0-9_]))[A-Z][A-Za-z0-9_]+/
+    ARG: /[^\\s;]+/
+{terminals}
+    %import python(COMMENT)
+    %import common(LETTER, DIGIT, WS)
+    %ignore WS
+    %ignore COMMENT
+"""
+
 # These are options usable by plugins to affect parsing. It is recommended to
 # leave use_helpers True in almost all cases, unless you want to handle parsing
 # of arguments at a low level in your plugin. The helpers parse things like
@@ -311,9 +369,366 @@ class NullParser:
     def parse(*args, **kwargs):
         pass
 
+def _prefer_keywords(terminal):
+    """Let keyword terminals such as ``ATTACHTYPE`` win over ``BARENAME``.
+
+    The Earley lexer tries every terminal the grammar allows at a given point;
+    the LALR lexer has to pick one, so terminals made only of alternative
+    words are given priority over the general-purpose name terminals.
+    """
+    if re.fullmatch(r"\(\?:\w+(\|\w+)*\)", terminal.pattern.value) and terminal.priority <= 0:
+        terminal.priority = 1
+
+LALR_KWARGS = dict(parser="lalr", lexer="contextual", edit_terminals=_prefer_keywords)
+
+# In LALR mode, the (module, verb) of each grammar which has no LALR parser
+# and so is always parsed with Earley (the verb is None for the top-level
+# grammar), and how many times each verb's LALR parser has failed and been
+# retried with Earley.
+EARLEY_ONLY = set()
+LALR_FALLBACKS = collections.Counter()
+
+class FallbackParser:
+    """Parses with a LALR parser, retrying with Earley if LALR fails.
+
+    FEZ grammars were written for Earley, and the LALR contextual lexer can
+    occasionally split an argument differently from the Earley dynamic lexer.
+    Anything the LALR parser rejects is handed on to the Earley parser, which
+    is only built if it is needed. Each retry is counted in ``LALR_FALLBACKS``.
+    """
+    def __init__(self, lalr, earley, key=None):
+        self.lalr = lalr
+        self._earley = earley
+        self.key = key
+
+    def parse(self, text):
+        try:
+            return self.lalr.parse(text)
+        except lark.exceptions.UnexpectedInput:
+            LALR_FALLBACKS[self.key] += 1
+            return self._earley().parse(text)
+
+def _lalr_grammar(text):
+    """Adapt a grammar written for the Earley parser to the LALR parser.
+
+    Earley grammars use ``WS`` to separate glyph selectors, but a LALR lexer
+    throws ignored whitespace away before the parser sees it, so references
+    to it are removed from the rules. Without whitespace, a run of
+    single-character ``STARTGLYPHNAME`` tokens could no longer be told apart
+    from a following glyph name, so such runs are lexed as one token.
+    """
+    if "%ignore WS" not in text:
+        return text
+    lines = []
+    suffixname = False
+    for line in text.split("\n"):
+        stripped = line.strip()
+        if not stripped.startswith("%") and not re.match(r"[A-Z_][A-Z_0-9]*(\.\d+)?\s*:", stripped):
+            line = re.sub(r"\bWS\b\*?", "", line)
+            line, count = re.subn(r"\bSTARTGLYPHNAME\+", "SUFFIXNAME", line)
+            suffixname = suffixname or count > 0
+        lines.append(line)
+    if suffixname:
+        lines.append("SUFFIXNAME: STARTGLYPHNAME+")
+    return "\n".join(lines)
+
+def _compile_lalr(cache, text, lark_kwargs):
+    """Build a LALR parser for a grammar written for Earley, if it can have one."""
+    try:
+        parser = cache.lark(_lalr_grammar(text), **dict(lark_kwargs, **LALR_KWARGS))
+    except lark.exceptions.GrammarError:
+        return None
+    for rule in parser.rules:
+        if any(sym.name in parser.ignore_tokens for sym in rule.expansion):
+            return None
+    return parser
+
+def _build_parser(cache, module, name, text, lark_kwargs, lalr=False):
+    """Fetch a parser for the grammar text from the registry, building it if needed.
+
+    In LALR mode, grammars which are not LALR(1), or which use other ignored
+    terminals in their rules, get an Earley parser instead, and are recorded
+    in ``EARLEY_ONLY``.
+    """
+    def earley():
+        key = (module, name, grammar_digest(text, **lark_kwargs))
+        return REGISTRY.get(key, lambda: cache.lark(text, **lark_kwargs))
+
+    if not lalr:
+        return earley()
+
+    def build_lalr():
+        if cache.pregenerated:
+            parser = cache.pregenerated.lalr(text, **lark_kwargs)
+            if parser is not MISSING:
+                return parser
+        return _compile_lalr(cache, text, lark_kwargs)
+
+    key = (module, name, grammar_digest(text, **dict(lark_kwargs, **LALR_KWARGS)))
+    lalr_parser = REGISTRY.get(key, build_lalr)
+    if lalr_parser is None:
+        EARLEY_ONLY.add((module, name))
+        return earley()
+    return FallbackParser(lalr_parser, earley, (module, name))
+
+def _single_pass_prefix(verb, name):
+    """The prefix given to ``name`` in the single-pass grammar for a verb.
+
+    Lark tells rules and terminals apart by case, so the verb name is
+    lower-cased for rules and upper-cased for terminals.
+    """
+    if name.lstrip("_")[:1].isupper():
+        return verb.upper() + "__"
+    return verb.lower() + "__"
+
+def _single_pass_mangler(verb):
+    def mangle(name):
+        if name == "statement":
+            return name
+        if name.startswith("_"):
+            return "_" + _single_pass_prefix(verb, name) + name[1:]
+        return _single_pass_prefix(verb, name) + name
+    return mangle
+
+def _demangle(tree, verb):
+    """Strip the single-pass prefixes from a verb's parse tree.
+
+    This gives the verb's transformer the same rule and terminal names as
+    a tree from the verb's own parser. Already-transformed statements
+    nested inside the tree are left alone.
+    """
+    if isinstance(tree, lark.Token):
+        prefix = _single_pass_prefix(verb, tree.type)
+        if tree.type.startswith(prefix):
+            return lark.Token.new_borrow_pos(tree.type[len(prefix):], tree.value, tree)
+        return tree
+    if isinstance(tree, lark.Tree):
+        data = tree.data
+        prefix = _single_pass_prefix(verb, data)
+        if data.startswith(prefix):
+            data = data[len(prefix):]
+        return lark.Tree(data, [_demangle(c, verb) for c in tree.children], tree.meta)
+    return tree
+
+def _grammar_definitions(builder):
+    """The rules and terminals a ``GrammarBuilder`` has loaded, by name.
+
+    Lark has no public way to move loaded definitions from one builder to
+    another, so this reaches into ``GrammarBuilder._definitions``. Lark is
+    held below version 2 in requirements.txt, and ``test_lark_internals``
+    fails if the attribute goes away.
+    """
+    return builder._definitions
+
+def _single_pass_digest(verbs, lark_kwargs):
+    """A digest identifying the single-pass grammar for a set of verbs.
+
+    It is worked out from the grammar texts alone, so that it can be
+    compared without building the parser.
+    """
+    return grammar_digest(
+        SINGLE_PASS_GRAMMAR
+        + "".join(
+            "%s\n%s\n%s%s" % (name, verb.module, verb.rules, verb.grammar or "")
+            for name, verb in verbs.items()
+        ),
+        **lark_kwargs
+    )
+
+def _build_single_pass_parser(verbs, lark_kwargs):
+    """Build an Earley parser for the FEZ grammar with every verb's rules in it.
+
+    Each verb's grammar is loaded once (see ``Verb.definitions``), so
+    registering a new plugin only loads that plugin's grammars before the
+    combined grammar is compiled again. Verbs without a ``start`` rule, or
+    whose names clash once lower-cased, are parsed in two passes as usual.
+
+    Returns the parser, which is shared by every set of verbs with the same
+    ``_single_pass_digest``.
+    """
+    definitions = {}
+    known = []
+    for name, verb in verbs.items():
+        verb_definitions = verb.definitions
+        if verb_definitions is None or any(k.lower() == name.lower() for k in known):
+            continue
+        definitions.update(verb_definitions)
+        known.append(name)
+
+    text = SINGLE_PASS_GRAMMAR.format(
+        verbs="".join('%s__VERBNAME %s__start ";" | ' % (v.upper(), v.lower()) for v in known),
+        names="|".join(known) or "(?!)",
+        terminals="".join('    %s__VERBNAME: "%s"\n' % (v.upper(), v) for v in known),
+    )
+    key = ("fez", "<single-pass>", _single_pass_digest(verbs, lark_kwargs))
+
+    def build():
+        builder = GrammarBuilder()
+        builder.load_grammar(text, "<single-pass>")
+        _grammar_definitions(builder).update(definitions)
+        return lark.Lark(builder.build(), **lark_kwargs)
+
+    return REGISTRY.get(key, build)
+
+_STATEMENT_SPECIALS = re.compile(rb'[;{}#"]')
+_STRING_SPECIALS = re.compile(rb'["\\]')
+_COMMENT_END = re.compile(rb"\n")
+_COMMENTS = re.compile(rb"#[^\n]*")
+
+def split_statements(f, chunk_size=1 << 16):
+    """Split FEZ source into top-level statements without parsing it.
+
+    A statement ends at a ``;`` which is outside any braces, comments and
+    strings. The source is read from a binary file object a chunk at a
+    time, so only the statement being split needs to be held in memory.
+
+    Yields:
+        ``(text, line, offset)`` for each statement: its text as bytes, the
+        line it starts on, and the number of bytes read up to its end.
+    """
+    buf = b""
+    start = pos = 0
+    consumed = 0
+    depth = 0
+    line = 1
+    state = None
+    eof = False
+    while True:
+        if state == "comment":
+            m = _COMMENT_END.search(buf, pos)
+        elif state == "string":
+            m = _STRING_SPECIALS.search(buf, pos)
+        else:
+            m = _STATEMENT_SPECIALS.search(buf, pos)
+        if m is None:
+            if eof:
+                break
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            # Drop the statements already yielded before growing the buffer
+            consumed += start
+            pos = max(pos, len(buf)) - start
+            buf = buf[start:] + chunk
+            start = 0
+            continue
+        c = m.group()
+        pos = m.end()
+        if state == "comment":
+            state = None
+        elif state == "string":
+            if c == b"\\":
+                pos += 1
+            else:
+                state = None
+        elif c == b"#":
+            state = "comment"
+        elif c == b'"':
+            state = "string"
+        elif c == b"{":
+            depth += 1
+        elif c == b"}":
+            depth -= 1
+        elif depth == 0:
+            text = buf[start:pos]
+            yield text, line, consumed + pos
+            line += text.count(b"\n")
+            start = pos
+    rest = buf[start:]
+    if _COMMENTS.sub(b"", rest).strip():
+        yield rest, line, consumed + len(buf)
+
+def _shift_lines(tree, lines):
+    """Move the positions in a parse tree down by a number of lines."""
+    if not lines:
+        return
+    for subtree in tree.iter_subtrees():
+        if not subtree.meta.empty:
+            subtree.meta.line += lines
+            subtree.meta.end_line += lines
+        for child in subtree.children:
+            if isinstance(child, lark.Token) and child.line is not None:
+                child.line += lines
+                child.end_line += lines
+
 class Verb:
+    """A verb provided by a plugin.
+
+    A verb keeps the text of its grammars and only compiles them into parsers
+    when it is first used, so that loading a plugin costs nothing for the
+    verbs a FEZ file never mentions. Compiled parsers come from the
+    process-wide ``REGISTRY``, so they are shared by every ``FezParser``.
+    """
     transformer = None
-    parser = None
+
+    def __init__(self, rules, grammar=None, bbgrammar=None, abgrammar=None, cache=None, lark_kwargs=None, module=None, name=None, lalr=False):
+        self.module = module
+        self.name = name
+        self.rules = rules
+        self.grammar = grammar
+        self.bbgrammar = bbgrammar
+        self.abgrammar = abgrammar
+        self.cache = cache or ParserCache()
+        self.lark_kwargs = lark_kwargs or {}
+        self.lalr = lalr
+
+    def _compile(self, grammar):
+        return _build_parser(self.cache, self.module, self.name, self.rules+grammar, self.lark_kwargs, self.lalr)
+
+    @functools.cached_property
+    def parser(self):
+        return self._compile(self.grammar or "")
+
+    @functools.cached_property
+    def bbparser(self):
+        if not self.bbgrammar:
+            return NullParser()
+        return self._compile(self.bbgrammar)
+
+    @functools.cached_property
+    def abparser(self):
+        if not self.abgrammar:
+            return NullParser()
+        return self._compile(self.abgrammar)
+
+    @functools.cached_property
+    def definitions(self):
+        """The verb's grammar, loaded with its names prefixed for single-pass mode.
+
+        Returns ``None`` if the grammar has no ``start`` rule.
+        """
+        rules = self.rules
+        # The single-pass grammar defines ``statement`` itself
+        if rules.startswith(HELPERS):
+            rules = ARGUMENT_HELPERS + rules[len(HELPERS):]
+        text = rules + (self.grammar or "")
+
+        def load():
+            builder = GrammarBuilder()
+            builder.load_grammar(text, "<%s>" % self.name, mangle=_single_pass_mangler(self.name))
+            loaded = _grammar_definitions(builder)
+            if _single_pass_mangler(self.name)("start") not in loaded:
+                return None
+            return loaded
+
+        key = (self.module, self.name, "single-pass", grammar_digest(text))
+        return REGISTRY.get(key, load)
+
+class _OnFirstUse:
+    """A class attribute made by ``make(cls)`` when it is first used, so that
+    the cache directory is only looked up once ``set_cache_dir`` has had a
+    chance to be called, rather than when FEZ is imported."""
+
+    def __init__(self, make):
+        self.make = make
+
+    def __set_name__(self, owner, name):
+        self.owner, self.name = owner, name
+
+    def __get__(self, obj, cls):
+        value = self.make(self.owner)
+        setattr(self.owner, self.name, value)
+        return value
+
 
 class FezParser:
     DEFAULT_PLUGINS = [
@@ -332,24 +747,73 @@ class FezParser:
         "Variables",
     ]
 
-    plugins = dict()
-    variables = dict()
     current_file = pathlib.Path().absolute()
     lark_kwargs = dict(propagate_positions=True)
-
-    parser = lark.Lark(HELPERS+GRAMMAR, **lark_kwargs)
-
-    def __init__(self, font):
+    # Use LALR parsers (falling back to Earley where necessary) instead of
+    # Earley parsers. Much faster on long files.
+    lalr = False
+    # Parse each statement straight into its verb's rules, using one grammar
+    # containing every verb, instead of parsing the statement's arguments a
+    # second time. Always uses Earley; overrides `lalr` for the top level.
+    single_pass = False
+
+    cache = _OnFirstUse(lambda cls: ParserCache(default_cache_dir(), PregeneratedParsers()))
+    include_cache = _OnFirstUse(lambda cls: TreeCache(default_cache_dir()))
+    metrics_cache = _OnFirstUse(lambda cls: MetricsCache(default_cache_dir()))
+    parser = _OnFirstUse(lambda cls: _build_parser(cls.cache, "fez", None, HELPERS+GRAMMAR, cls.lark_kwargs))
+
+    def __init__(self, font, lalr=None, single_pass=None):
+        if lalr is not None:
+            self.lalr = lalr
+        if single_pass is not None:
+            self.single_pass = single_pass
+        if self.lalr:
+            self.parser = _build_parser(self.cache, "fez", None, HELPERS+GRAMMAR, self.lark_kwargs, lalr=True)
+
+        self._single_pass_parser = None
+        self.plugins = dict()
         for p in self.DEFAULT_PLUGINS:
             self.load_plugin(p)
 
         self.font = font
+        self.variables = GenerationDict()
         self.transformer = FezTransformer(self)
+        from fontFeatures import FontFeatures
         self.fontfeatures = FontFeatures()
-        self.fontfeatures.setGlyphClassesFromFont(self.font)
+        self.fontfeatures.namedClasses = NamedClasses()
+        self.fontfeatures.anchors = AnchorStore()
+        self.fontfeatures.glyphclasses = GenerationDict()
+        # A parser without a font can still compile programs
+        if self.font is not None:
+            self.fontfeatures.setGlyphClassesFromFont(self.font)
         self.current_feature = None
         self.font_modified = False
 
+    @property
+    def font_modified(self):
+        return self._font_modified
+
+    @font_modified.setter
+    def font_modified(self, modified):
+        self._font_modified = modified
+        if modified:
+            self.glyph_index.invalidate()
+
+    @property
+    def selector_cache(self):
+        """The ``SelectorCache`` of the parser's named classes, or ``None``."""
+        return getattr(self.fontfeatures.namedClasses, "selector_cache", None)
+
+    @property
+    def glyph_metrics(self):
+        """The ``GlyphMetricsTable`` of the parser's font."""
+        return self.glyph_index.metrics(self.metrics_cache)
+
+    @property
+    def glyph_index(self):
+        """The ``GlyphIndex`` of the parser's font."""
+        return glyph_index(self.font)
+
     def load_plugin(self, plugin) -> bool:
         if "." not in plugin:
             resolved_plugin = "fez." + plugin
@@ -371,48 +835,147 @@ class FezParser:
         rules = HELPERS+mod.GRAMMAR if popts["use_helpers"] else mod.GRAMMAR
 
         for v in verbs:
-            verb = Verb()
-            verb_grammar = getattr(mod, v+"_GRAMMAR", None)
-            verb_bbgrammar = getattr(mod, v+"_beforebrace_GRAMMAR", None)
-            verb_abgrammar = getattr(mod, v+"_afterbrace_GRAMMAR", None)
-
-            if verb_grammar:
-                verb.parser = lark.Lark(rules+verb_grammar, **self.lark_kwargs)
-            else:
-                verb.parser = lark.Lark(rules, **self.lark_kwargs)
-
-            if verb_bbgrammar:
-                verb.bbparser = lark.Lark(rules+verb_bbgrammar, **self.lark_kwargs)
-            else:
-                verb.bbparser = NullParser()
-
-            if verb_abgrammar:
-                verb.abparser = lark.Lark(rules+verb_abgrammar, **self.lark_kwargs)
-            else:
-                verb.abparser = NullParser()
-
+            verb = Verb(
+                rules,
+                grammar=getattr(mod, v+"_GRAMMAR", None),
+                bbgrammar=getattr(mod, v+"_beforebrace_GRAMMAR", None),
+                abgrammar=getattr(mod, v+"_afterbrace_GRAMMAR", None),
+                cache=self.cache,
+                lark_kwargs=self.lark_kwargs,
+                module=mod.__name__,
+                name=v,
+                lalr=self.lalr,
+            )
             verb.transformer = getattr(mod, v)
             self.plugins[v] = verb
+        # The single-pass grammar is rebuilt to include the new verbs the
+        # next time it is needed.
+        self._single_pass_parser = None
+
+    @property
+    def single_pass_parser(self):
+        if self._single_pass_parser is None:
+            self._single_pass_parser = _build_single_pass_parser(self.plugins, self.lark_kwargs)
+        return self._single_pass_parser
+
+    def plugin_modules(self):
+        """Return the names of the modules of the parser's verbs, in the
+        order they were registered."""
+        return list(dict.fromkeys(verb.module for verb in self.plugins.values()))
+
+    @property
+    def grammar_key(self):
+        """A digest identifying the grammar used by ``parseTree``.
+
+        Trees from parsers with different keys cannot be used in place of
+        each other.
+        """
+        return self._grammar_key(self.single_pass)
 
-    def parseFile(self, filename):
+    def _grammar_key(self, single_pass):
+        if single_pass:
+            return _single_pass_digest(self.plugins, self.lark_kwargs)
+        return grammar_digest(HELPERS+GRAMMAR, lalr=self.lalr, **self.lark_kwargs)
+
+    def parseFile(self, filename, stream=False, progress=None):
         """Load a FEZ features file.
 
         Args:
             filename: Name of the file to read.
+            stream: If true, parse the file one statement at a time (see
+                ``parseStream``) rather than all at once.
+            progress: In streaming mode, a function called with the number
+                of bytes parsed so far and the size of the file.
         """
+        self.current_file = filename
+        if stream:
+            rv = []
+            with open(filename, "rb") as f:
+                total = os.fstat(f.fileno()).st_size
+                for results in self.parseStream(f, progress=progress, total=total):
+                    rv.extend(results)
+            return rv
         with open(filename, "r") as f:
             data = f.read()
-        self.current_file = filename
         return self.parseString(data)
 
+    def parseStream(self, f, progress=None, total=None):
+        """Load FEZ features from a binary file object, one statement at a time.
+
+        Each top-level statement is parsed and transformed before the next one
+        is read, so rules are added to ``self.fontfeatures`` as the file goes
+        along and only one statement's parse tree is held at a time.
+
+        Args:
+            f: A binary file object containing layout rules in FEZ format.
+            progress: A function called after each statement with the number
+                of bytes parsed so far and ``total``.
+            total: The size of the input, if known; only passed on to ``progress``.
+
+        Yields:
+            The results of each top-level statement.
+        """
+        for text, line, offset in split_statements(f):
+            tree = self.parseTree(text.decode("utf-8"))
+            _shift_lines(tree, line - 1)
+            yield self.transformTree(tree)
+            if progress:
+                progress(offset, total)
+
+    def compileFile(self, filename):
+        """Compile a FEZ features file into a ``FezProgram``.
+
+        Args:
+            filename: Name of the file to read.
+        """
+        with open(filename, "r") as f:
+            data = f.read()
+        return self._program(self.single_pass_parser.parse(data), filename)
+
+    def compileString(self, s):
+        """Compile FEZ features information into a ``FezProgram``.
+
+        Compiling does not look at the font, so this parser can be created
+        with ``font=None``.
+
+        Args:
+            s: Layout rules in FEZ format.
+        """
+        return self._program(self.single_pass_parser.parse(s))
+
+    def _program(self, tree, filename=None):
+        defaults = {p if "." in p else "fez." + p for p in self.DEFAULT_PLUGINS}
+        plugins = [m for m in self.plugin_modules() if m not in defaults]
+        return FezProgram(tree, self._grammar_key(True), filename, plugins)
+
     def parseString(self, s, top_is_statements=True):
         """LoadFEZ features information from a string.
 
         Args:
             s: Layout rules in FEZ format.
         """
+        return self.transformTree(self.parseTree(s), top_is_statements)
+
+    def parseTree(self, s):
+        """Parse a string of FEZ into a Lark tree, without running any verbs.
+
+        Args:
+            s: Layout rules in FEZ format.
+        """
+        parser = self.single_pass_parser if self.single_pass else self.parser
+        return parser.parse(s)
+
+    def transformTree(self, tree, top_is_statements=True):
+        """Run the verbs in a tree returned by ``parseTree`` against the font.
+
+        Args:
+            tree: A parse tree from ``parseTree``.
+        """
+        if self.font is not None:
+            # Notice glyphs renamed since the last statements were run
+            self.glyph_index.refresh(check_names=True)
         try:
-            rv = self.transformer.transform(self.parser.parse(s))
+            rv = self.transformer.transform(tree)
             if top_is_statements:
                 rv = self.expand_statements(rv)
         except VisitError as e:
@@ -420,6 +983,7 @@ class FezParser:
         return rv
 
     def filterResults(self, results):
+        from more_itertools import collapse
         ret = [x for x in collapse(results) if x and not isinstance(x, str)]
         return ret
 
@@ -443,6 +1007,85 @@ class FezParser:
         return rv
 
 
+def set_cache_dir(cache_dir):
+    """Use ``cache_dir`` for all of FEZ's on-disk caches.
+
+    This overrides ``$FEZ_CACHE_DIR`` for parsers created afterwards;
+    ``None`` turns the on-disk caches off, as when it is not set.
+    """
+    FezParser.cache = ParserCache(cache_dir, PregeneratedParsers())
+    FezParser.include_cache = TreeCache(cache_dir)
+    FezParser.metrics_cache = MetricsCache(cache_dir)
+
+
+class FezProgram:
+    """FEZ source compiled into a form which does not depend on any font.
+
+    A program is the single-pass parse tree of the source: every statement
+    has been parsed into its verb's rules, but no glyph selectors, variables
+    or verbs have been resolved. Running it against a font does that. A
+    program can be pickled, so it can be saved with ``save`` and sent to
+    other processes to run against many fonts in parallel.
+
+    Programs are made with ``FezParser.compileString`` or
+    ``FezParser.compileFile``, and can only be run by parsers which have
+    the same plugins as the one which compiled them. The modules of any
+    plugins beyond the default ones are listed in ``plugins``.
+
+    A saved program is a pickle, and loading a pickle can run arbitrary
+    code: only ``load`` programs from files you trust as much as the code
+    you run.
+    """
+    def __init__(self, tree, grammar_key, filename=None, plugins=()):
+        self.tree = tree
+        self.grammar_key = grammar_key
+        self.filename = filename
+        self.plugins = list(plugins)
+
+    def run(self, font, plugins=None):
+        """Run the program against a font.
+
+        Args:
+            font: The font to run against.
+            plugins: The plugins to load before running, as module names or
+                modules; by default, those listed in ``self.plugins``.
+
+        Returns:
+            The ``FezParser`` used, whose ``fontfeatures`` holds the results.
+        """
+        parser = FezParser(font, single_pass=True)
+        loaded = set(parser.plugin_modules())
+        for plugin in self.plugins if plugins is None else plugins:
+            if isinstance(plugin, str):
+                if plugin not in loaded:
+                    parser.load_plugin(plugin)
+            elif plugin.__name__ not in loaded:
+                parser.register_plugin(plugin, plugin.__name__)
+        if parser.grammar_key != self.grammar_key:
+            raise ValueError("This FEZ program was compiled with different plugins")
+        if self.filename:
+            parser.current_file = self.filename
+        parser.transformTree(self.tree)
+        return parser
+
+    def save(self, filename):
+        with open(filename, "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, filename):
+        """Load a program written by ``save``.
+
+        This unpickles the file, which can run arbitrary code, so it must
+        only be used on files from a trusted source.
+        """
+        with open(filename, "rb") as f:
+            program = pickle.load(f)
+        if not isinstance(program, cls):
+            raise ValueError("%s is not a compiled FEZ program" % filename)
+        return program
+
+
 class FezTransformer(lark.Transformer):
     def __init__(self, parser):
         self.parser = parser
@@ -459,6 +1102,10 @@ class FezTransformer(lark.Transformer):
 
         requested_plugin = self.parser.plugins[verb]
 
+        # In single-pass mode, known verbs arrive already parsed by their own rules
+        if not isinstance(args, list):
+            return self._parsed_statement(verb, requested_plugin, _demangle(args, verb))
+
         # This branch is called for plugins that use `statement` in their grammar (and use_helpers), it allows the statements to resolve themselves so you aren't given the args as a string. Most such plugins use brackets, e.g. Feature, Routine
         tuple_idxs = list( (i for i,v in enumerate(args) if isinstance(v, tuple)) )
         if len(tuple_idxs) > 0:
@@ -468,43 +1115,64 @@ class FezTransformer(lark.Transformer):
             after = args[last_tuple_idx+1:]
             before_tree = requested_plugin.bbparser.parse(' '.join(before))
             after_tree  = requested_plugin.abparser.parse(' '.join(after))
-            transformer = requested_plugin.transformer(self.parser)
-            ret = []
-            if before_tree:
-                try:
-                    before_args = (verb, [transformer._THUNK, lambda : transformer.transform(before_tree)])
-                except VisitError as e:
-                    raise e.orig_exc
-                ret.insert(0, before_args if len(before_args) > 0 else None)
-            else:
-                ret.insert(0, None)
-            ret.append(statements)
-            if after_tree:
-                try:
-                    after_args = (verb, [transformer._THUNK, lambda : transformer.transform(after_tree)])
-                except VisitError as e:
-                    raise e.orig_exc
-                ret.append(after_args if len(after_args) > 0 else None)
-            else:
-                ret.append(None)
-            verb_ret = (verb, [transformer._THUNK, lambda: transformer.action(ret)])
+            verb_ret = self._braced_statement(verb, requested_plugin, before_tree, statements, after_tree)
         # For normal plugins that don't take statements
         elif len(args) == 0 or isinstance(args[0], str):
             tree = requested_plugin.parser.parse(' '.join(args))
-            try:
-                transformer = requested_plugin.transformer(self.parser)
-                if transformer.immediate:
-                    verb_ret = (verb, requested_plugin.transformer(self.parser).transform(tree))
-                else:
-                    verb_ret = (verb, [transformer._THUNK, lambda : transformer.transform(tree) ])
-            except VisitError as e:
-                raise e.orig_exc
+            verb_ret = self._simple_statement(verb, requested_plugin, tree)
         else:
             raise ValueError("Arguments of unknown type: {}".format(type(args)))
 
         #print("Parsed line...", verb_ret)
         return verb_ret
 
+    def _parsed_statement(self, verb, requested_plugin, tree):
+        children = tree.children if isinstance(tree, lark.Tree) else [tree]
+        tuple_idxs = [i for i,v in enumerate(children) if isinstance(v, tuple)]
+        if not tuple_idxs:
+            return self._simple_statement(verb, requested_plugin, tree)
+        # Split the tree the same way the brace parsers would have parsed it
+        first_tuple_idx, last_tuple_idx = tuple_idxs[0], tuple_idxs[-1]
+        statements = [children[ti] for ti in tuple_idxs]
+        before_tree = after_tree = None
+        if requested_plugin.bbgrammar:
+            before_tree = lark.Tree("beforebrace", children[:first_tuple_idx])
+        if requested_plugin.abgrammar:
+            after_tree = lark.Tree("afterbrace", children[last_tuple_idx+1:])
+        return self._braced_statement(verb, requested_plugin, before_tree, statements, after_tree)
+
+    def _braced_statement(self, verb, requested_plugin, before_tree, statements, after_tree):
+        transformer = requested_plugin.transformer(self.parser)
+        ret = []
+        if before_tree:
+            try:
+                before_args = (verb, [transformer._THUNK, lambda : transformer.transform(before_tree)])
+            except VisitError as e:
+                raise e.orig_exc
+            ret.insert(0, before_args if len(before_args) > 0 else None)
+        else:
+            ret.insert(0, None)
+        ret.append(statements)
+        if after_tree:
+            try:
+                after_args = (verb, [transformer._THUNK, lambda : transformer.transform(after_tree)])
+            except VisitError as e:
+                raise e.orig_exc
+            ret.append(after_args if len(after_args) > 0 else None)
+        else:
+            ret.append(None)
+        return (verb, [transformer._THUNK, lambda: transformer.action(ret)])
+
+    def _simple_statement(self, verb, requested_plugin, tree):
+        try:
+            transformer = requested_plugin.transformer(self.parser)
+            if transformer.immediate:
+                return (verb, requested_plugin.transformer(self.parser).transform(tree))
+            else:
+                return (verb, [transformer._THUNK, lambda : transformer.transform(tree) ])
+        except VisitError as e:
+            raise e.orig_exc
+
     def verb(self, args):
         assert len(args) == 1
         return args[0].value
@@ -552,14 +1220,10 @@ class FEZVerb(lark.Transformer):
         return ScalarOrVariable(glyph.token, self.parser, metric=metric.value)
 
     def _get_metrics(self, glyph, metric=None):
-        metrics = get_glyph_metrics(self.parser.font, glyph)
         if metric is not None:
-            if metric not in TESTVALUE_METRICS:
-                raise ValueError("Unknown metric '%s'" % metric)
-            else:
-                return metrics[metric]
+            return self.parser.glyph_metrics.value(glyph, metric)
         else:
-            return metrics
+            return self.parser.glyph_metrics.get(glyph)
 
     def glyphsuffix(self, args):
         (suffixtype, suffix) = args[0].value, "".join([a.value for a in args[1:]])
@@ -607,6 +1271,7 @@ class FEZVerb(lark.Transformer):
         return loc
 
     def variable_scalar(self, args):
+        from fontTools.feaLib.variableScalar import VariableScalar
         vs = VariableScalar()
         vs.axes = self.parser.font.axes
         args = iter(args)
@@ -0,0 +1,155 @@
+"""
+Anchor store
+============
+
+``fontfeatures.anchors`` maps each glyph name to a dictionary of its anchor
+names and positions, so finding the glyphs which have a given anchor, as
+``Attach`` and the ``hasanchor()`` predicate do, means looking at every
+glyph. ``FezParser`` keeps its anchors in an ``AnchorStore`` instead: a
+dictionary of the same shape which also keeps an inverted index from each
+anchor name to the glyphs which have it and their positions there.
+
+The index is kept up to date as anchors are added, changed and removed,
+whether a glyph's anchors are assigned (``anchors[glyph] = {...}``) or
+changed in place (``anchors[glyph][name] = (x, y)``). Each glyph's anchors
+are held in a ``GlyphAnchors`` dictionary belonging to the store, so
+assigning one glyph's anchors to another copies them.
+"""
+
+import types
+
+
+class AnchorStore(dict):
+    """A dictionary mapping glyph names to dictionaries of anchor positions,
+    indexed by anchor name."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__()
+        self._by_anchor = {}
+        self.update(*args, **kwargs)
+
+    def glyphs_with(self, anchorname):
+        """Return a read-only mapping of each glyph with the named anchor to
+        the anchor's position."""
+        return types.MappingProxyType(self._by_anchor.get(anchorname, {}))
+
+    def _index(self, glyphname, anchorname, position):
+        self._by_anchor.setdefault(anchorname, {})[glyphname] = position
+
+    def _unindex(self, glyphname, anchorname):
+        glyphs = self._by_anchor[anchorname]
+        del glyphs[glyphname]
+        if not glyphs:
+            del self._by_anchor[anchorname]
+
+    def _detach(self, glyphname):
+        anchors = dict.get(self, glyphname)
+        if anchors is not None:
+            for anchorname in anchors:
+                self._unindex(glyphname, anchorname)
+            anchors._store = None
+        return anchors
+
+    def __setitem__(self, glyphname, anchors):
+        anchors = dict(anchors)
+        self._detach(glyphname)
+        new = GlyphAnchors(self, glyphname)
+        super().__setitem__(glyphname, new)
+        new.update(anchors)
+
+    def __delitem__(self, glyphname):
+        self._detach(glyphname)
+        super().__delitem__(glyphname)
+
+    def clear(self):
+        for anchors in self.values():
+            anchors._store = None
+        super().clear()
+        self._by_anchor.clear()
+
+    def pop(self, glyphname, *default):
+        if glyphname not in self:
+            return super().pop(glyphname, *default)
+        self._detach(glyphname)
+        return super().pop(glyphname)
+
+    def popitem(self):
+        if not self:
+            raise KeyError("popitem(): dictionary is empty")
+        glyphname = next(reversed(self))
+        return (glyphname, self.pop(glyphname))
+
+    def setdefault(self, glyphname, default=None):
+        if glyphname not in self:
+            self[glyphname] = default or {}
+        return self[glyphname]
+
+    def update(self, *args, **kwargs):
+        for glyphname, anchors in dict(*args, **kwargs).items():
+            self[glyphname] = anchors
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+
+class GlyphAnchors(dict):
+    """The anchors of one glyph in an ``AnchorStore``, mapping anchor names
+    to positions."""
+
+    def __init__(self, store, glyphname):
+        super().__init__()
+        self._store = store
+        self.glyphname = glyphname
+
+    def __setitem__(self, anchorname, position):
+        super().__setitem__(anchorname, position)
+        if self._store is not None:
+            self._store._index(self.glyphname, anchorname, position)
+
+    def __delitem__(self, anchorname):
+        super().__delitem__(anchorname)
+        if self._store is not None:
+            self._store._unindex(self.glyphname, anchorname)
+
+    def clear(self):
+        for anchorname in list(self):
+            del self[anchorname]
+
+    def pop(self, anchorname, *default):
+        if anchorname not in self:
+            return super().pop(anchorname, *default)
+        position = self[anchorname]
+        del self[anchorname]
+        return position
+
+    def popitem(self):
+        if not self:
+            raise KeyError("popitem(): dictionary is empty")
+        anchorname = next(reversed(self))
+        return (anchorname, self.pop(anchorname))
+
+    def setdefault(self, anchorname, default=None):
+        if anchorname not in self:
+            self[anchorname] = default
+        return self[anchorname]
+
+    def update(self, *args, **kwargs):
+        for anchorname, position in dict(*args, **kwargs).items():
+            self[anchorname] = position
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+
+def glyphs_with_anchor(anchors, anchorname):
+    """Return a mapping of each glyph with the named anchor to its position.
+
+    ``anchors`` is normally an ``AnchorStore``, but a plain dictionary of the
+    same shape (say, one assigned to ``fontfeatures.anchors`` by hand) is
+    searched glyph by glyph.
+    """
+    if isinstance(anchors, AnchorStore):
+        return anchors.glyphs_with(anchorname)
+    return {g: v[anchorname] for g, v in anchors.items() if anchorname in v}
@@ -0,0 +1,102 @@
+"""
+Binning
+=======
+
+``DefineClassBinned`` and several plugins (``BYMoveDots``, ``BYFixOverhang``,
+``KernToDistance``, ``Fractions``) organise glyphs into bins of similar
+metrics. This module does the clustering: an optimal one-dimensional
+k-means ("ckmeans"), as in ``glyphtools``, but run over the sorted *distinct*
+values of the metric, weighted by how many glyphs share each value, and with
+each step of the dynamic programme done as a NumPy operation.
+
+Bins are memoized by the font's ``GlyphMetricsTable`` (see
+``GlyphMetricsTable.bin``), so verbs binning the same glyphs by the same
+metric share the result. ``benchmarks/binning.py`` compares this with
+calling ``glyphtools.bin_glyphs_by_metric`` each time.
+"""
+
+import statistics
+
+import numpy as np
+
+
+def ckmeans(values, k, weights=None):
+    """Cluster values into ``k`` groups with the least sum of squared
+    distances from each group's mean.
+
+    Args:
+        values: Sorted, distinct numbers.
+        k: The number of clusters. Fewer are made if there are fewer values.
+        weights: How many times each value occurs (by default, once).
+
+    Returns:
+        A list of ``(first, last)`` positions in ``values`` of each cluster,
+        in increasing order.
+    """
+    values = np.asarray(values, dtype=float)
+    m = len(values)
+    if m == 0:
+        return []
+    weights = np.ones(m) if weights is None else np.asarray(weights, dtype=float)
+    k = max(1, min(k, m))
+
+    # Prefix sums, shifted by the median for numerical stability, give the
+    # sum of squares of any run of values in constant time.
+    x = values - values[m // 2]
+    w_sum = np.concatenate(([0.0], np.cumsum(weights)))
+    x_sum = np.concatenate(([0.0], np.cumsum(weights * x)))
+    x2_sum = np.concatenate(([0.0], np.cumsum(weights * x * x)))
+
+    def cost(first, last):
+        w = w_sum[last + 1] - w_sum[first]
+        s = x_sum[last + 1] - x_sum[first]
+        return np.maximum(x2_sum[last + 1] - x2_sum[first] - s * s / w, 0)
+
+    # best[c, i]: least cost of putting values[0..i] into c+1 clusters;
+    # start[c, i]: where the last of those clusters starts.
+    best = np.zeros((k, m))
+    start = np.zeros((k, m), dtype=int)
+    best[0] = cost(0, np.arange(m))
+    for c in range(1, k):
+        for i in range(c, m):
+            firsts = np.arange(c, i + 1)
+            totals = best[c - 1, firsts - 1] + cost(firsts, i)
+            j = int(np.argmin(totals))
+            best[c, i] = totals[j]
+            start[c, i] = firsts[j]
+
+    clusters = []
+    last = m - 1
+    for c in range(k - 1, -1, -1):
+        first = int(start[c, last]) if c else 0
+        clusters.append((first, last))
+        last = first - 1
+    return clusters[::-1]
+
+
+def bin_values(values, bincount=5):
+    """Organise a dictionary of values into bins of similar values.
+
+    This returns the same as ``glyphtools.bin_dictionary``: a list of
+    ``(keys, mean)`` pairs in increasing order of value, where ``keys`` are
+    in the order of the dictionary and ``mean`` is rounded down to an
+    integer. Keys with equal values always share a bin, so fewer than
+    ``bincount`` bins are returned if there are fewer distinct values.
+    """
+    keys = list(values)
+    if not keys:
+        return []
+    data = np.array([values[key] for key in keys], dtype=float)
+    distinct, inverse, counts = np.unique(data, return_inverse=True, return_counts=True)
+    clusters = ckmeans(distinct, bincount, counts)
+
+    cluster_of = np.empty(len(distinct), dtype=int)
+    for c, (first, last) in enumerate(clusters):
+        cluster_of[first : last + 1] = c
+    key_cluster = cluster_of[inverse.reshape(-1)]
+
+    binned = []
+    for c in range(len(clusters)):
+        members = tuple(keys[i] for i in np.flatnonzero(key_cluster == c))
+        binned.append((members, int(statistics.mean(values[key] for key in members))))
+    return binned
@@ -0,0 +1,452 @@
+"""
+Parser caching
+==============
+
+Building a FEZ parser means compiling a Lark grammar for every verb of every
+plugin, and most of that time goes into Lark reading the grammar text itself.
+The ``ParserCache`` stores each loaded grammar on disk, keyed by a hash of the
+grammar text, the Lark version and the Python version, so that later runs can
+skip straight to building the parser. Grammars cached by other versions of
+Lark or Python are removed the first time the cache is written to.
+
+The ``TreeCache`` does the same for the parse trees of files brought in with
+``Include``, which are often shared between many fonts, and the
+``MetricsCache`` for glyph metrics, stored under a hash of each glyph's
+outlines so that only glyphs which have changed are measured again.
+
+Nothing is written to disk unless a cache directory is given, either in
+``$FEZ_CACHE_DIR``, with ``fez.set_cache_dir`` or with ``fez2fea
+--cache-dir``. Cache entries are pickles, and loading a pickle can run
+arbitrary code, so the cache directory must not be writable by anyone you
+would not let run code as you. FEZ creates it (but not its parents) readable
+and writable by the current user only.
+
+Parsers for the built-in plugins are also generated ahead of time and shipped
+in the ``fez/parsers`` directory (see ``fez.pregenerate``), so that even the
+first run does not have to load their grammars.
+
+Within a process, compiled parsers are also kept in a ``ParserRegistry``, so
+that every ``FezParser`` (in any thread) shares the same parser objects
+rather than building its own.
+"""
+
+import functools
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import threading
+
+import lark
+from lark.load_grammar import load_grammar
+
+
+def _make_cache_dir(cache_dir):
+    os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+
+
+def _write_pickle(cache_dir, path, obj):
+    """Pickle an object into a cache file, ignoring any errors."""
+    try:
+        _make_cache_dir(cache_dir)
+        _make_cache_dir(os.path.dirname(path))
+        # Write to a temporary file and move it into place, so that
+        # concurrent builds never see a half-written cache entry.
+        fd, tmppath = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmppath, path)
+    except OSError:
+        pass
+
+
+def _read_pickle(path):
+    """Unpickle a cache file, returning ``None`` if it is missing or unreadable."""
+    try:
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    except Exception:
+        # A corrupt or stale cache file is no worse than a missing one.
+        return None
+
+
+def _unlink(path):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+def default_cache_dir():
+    """Return the cache directory given in ``$FEZ_CACHE_DIR``, or ``None`` if
+    it is unset or empty (and so nothing is cached on disk)."""
+    return os.environ.get("FEZ_CACHE_DIR") or None
+
+
+MISSING = object()
+
+PREGENERATED_DIR = os.path.join(os.path.dirname(__file__), "parsers")
+
+
+class PregeneratedParsers:
+    """Grammars and LALR parsers generated when FEZ was built.
+
+    They are read from a directory written by ``python -m fez.pregenerate``
+    (``make parsers``), whose ``manifest.json`` says which file holds each
+    grammar and parser. Each file is only read when its grammar is needed.
+    Nothing is used if the manifest is missing or was written by a different
+    version of Lark.
+    """
+
+    def __init__(self, directory=PREGENERATED_DIR):
+        self.directory = directory
+
+    @functools.cached_property
+    def _manifest(self):
+        try:
+            with open(os.path.join(self.directory, "manifest.json")) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if manifest.get("lark_version") != lark.__version__:
+            return {}
+        entries = manifest.get("parsers", [])
+        return {
+            "grammars": {e["grammar"]: e["grammar_file"] for e in entries},
+            "lalr": {e["lalr"]: e["lalr_file"] for e in entries},
+        }
+
+    def grammar(self, grammar):
+        """Return the loaded grammar for the grammar text, or ``None``."""
+        filename = self._manifest.get("grammars", {}).get(text_digest(grammar))
+        if filename is None:
+            return None
+        return _read_pickle(os.path.join(self.directory, filename))
+
+    def lalr(self, grammar, **kwargs):
+        """Return the LALR parser built for an Earley grammar text.
+
+        Returns ``None`` if the grammar was found to have no LALR parser, and
+        ``MISSING`` if it was not pregenerated.
+        """
+        parsers = self._manifest.get("lalr", {})
+        key = grammar_digest(grammar, **kwargs)
+        if key not in parsers:
+            return MISSING
+        if parsers[key] is None:
+            return None
+        try:
+            with open(os.path.join(self.directory, parsers[key]), "rb") as f:
+                return lark.Lark.load(f)
+        except OSError:
+            return MISSING
+
+
+class ParserCache:
+    """A directory of pickled Lark grammars.
+
+    Args:
+        cache_dir: Directory to store grammars in. If ``None``, nothing is
+            written to disk and every grammar is loaded afresh.
+        pregenerated: A ``PregeneratedParsers`` to look in before the cache
+            directory.
+    """
+
+    # Cached grammars can only be loaded by the Lark and Python they were
+    # made with, so their file names say which those were.
+    version_tag = "lark%s-py%i.%i" % ((lark.__version__,) + sys.version_info[:2])
+
+    def __init__(self, cache_dir=None, pregenerated=None):
+        self.cache_dir = cache_dir
+        self.pregenerated = pregenerated
+        self.hits = 0
+        self.misses = 0
+        self._pruned = False
+
+    def key(self, grammar):
+        s = "%s\n%s\n%s" % (grammar, lark.__version__, sys.version_info[:2])
+        return hashlib.sha256(s.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, "grammar-%s-%s.pickle" % (self.version_tag, key))
+
+    def load_grammar(self, grammar):
+        """Return a loaded ``lark.load_grammar.Grammar`` for the grammar text."""
+        if self.pregenerated:
+            loaded = self.pregenerated.grammar(grammar)
+            if loaded is not None:
+                self.hits += 1
+                return loaded
+
+        if not self.cache_dir:
+            self.misses += 1
+            return load_grammar(grammar, "<string>", None, False)[0]
+
+        path = self._path(self.key(grammar))
+        loaded = _read_pickle(path)
+        if loaded is not None:
+            self.hits += 1
+            return loaded
+
+        self.misses += 1
+        loaded = load_grammar(grammar, "<string>", None, False)[0]
+        if not self._pruned:
+            self._pruned = True
+            self.prune()
+        _write_pickle(self.cache_dir, path, loaded)
+        return loaded
+
+    def lark(self, grammar, **kwargs):
+        """Build a ``lark.Lark`` parser for the grammar text, via the cache."""
+        return lark.Lark(self.load_grammar(grammar), **kwargs)
+
+    def _entries(self):
+        if not self.cache_dir or not os.path.isdir(self.cache_dir):
+            return []
+        return [
+            entry
+            for entry in os.listdir(self.cache_dir)
+            if entry.startswith("grammar-") and entry.endswith(".pickle")
+        ]
+
+    def prune(self):
+        """Remove grammars cached by other versions of Lark or Python."""
+        current = "grammar-%s-" % self.version_tag
+        for entry in self._entries():
+            if not entry.startswith(current):
+                _unlink(os.path.join(self.cache_dir, entry))
+
+    def clear(self):
+        """Remove all cached grammars from the cache directory."""
+        for entry in self._entries():
+            _unlink(os.path.join(self.cache_dir, entry))
+
+
+class TreeCache:
+    """Parse trees of included files, kept in memory and on disk.
+
+    Trees are stored under a hash of the file's contents and of the grammar
+    used to parse them, so an edited file is simply parsed again. The file is
+    read and hashed every time, rather than trusting its modification time
+    and size, which an edit (or a checkout) can leave unchanged; this costs
+    far less than parsing it. The hash is also remembered against the file's
+    path, so that when a file has changed, the tree parsed from its old
+    contents is removed.
+
+    Args:
+        cache_dir: Directory to store trees in. If ``None``, trees are only
+            kept in memory.
+    """
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+        self._digests = {}
+        self._trees = {}
+
+    def _path(self, kind, key):
+        return os.path.join(self.cache_dir, "%s-%s.pickle" % (kind, key))
+
+    def _tree_key(self, digest, grammar_key):
+        s = "%s\n%s\n%s" % (digest, grammar_key, lark.__version__)
+        return hashlib.sha256(s.encode("utf-8")).hexdigest()
+
+    def _forget_tree(self, key):
+        self._trees.pop(key, None)
+        if self.cache_dir:
+            _unlink(self._path("tree", key))
+
+    def tree(self, path, grammar_key, parse):
+        """Return the parse tree of the file at ``path``.
+
+        Args:
+            path: The file to parse.
+            grammar_key: A string identifying the grammar ``parse`` uses.
+            parse: A function which parses a string into a tree.
+        """
+        abspath = os.path.abspath(path)
+        with open(abspath) as f:
+            text = f.read()
+        digest = text_digest(text)
+        # The digest each file had when it was last parsed
+        path_key = text_digest(abspath)
+        previous = self._digests.get(abspath)
+        if previous is None and self.cache_dir:
+            previous = _read_pickle(self._path("digest", path_key))
+        if previous != digest:
+            if previous is not None:
+                self._forget_tree(self._tree_key(previous, grammar_key))
+            if self.cache_dir:
+                _write_pickle(self.cache_dir, self._path("digest", path_key), digest)
+        self._digests[abspath] = digest
+
+        key = self._tree_key(digest, grammar_key)
+        tree = self._trees.get(key)
+        if tree is None and self.cache_dir:
+            tree = _read_pickle(self._path("tree", key))
+        if tree is not None:
+            self.hits += 1
+            self._trees[key] = tree
+            return tree
+
+        self.misses += 1
+        tree = parse(text)
+        self._trees[key] = tree
+        if self.cache_dir:
+            _write_pickle(self.cache_dir, self._path("tree", key), tree)
+        return tree
+
+    def clear(self):
+        """Forget all cached trees, in memory and in the cache directory."""
+        self._digests.clear()
+        self._trees.clear()
+        if not self.cache_dir or not os.path.isdir(self.cache_dir):
+            return
+        for entry in os.listdir(self.cache_dir):
+            # stat- files are left by older versions of FEZ
+            if entry.startswith(("digest-", "stat-", "tree-")) and entry.endswith(".pickle"):
+                _unlink(os.path.join(self.cache_dir, entry))
+
+
+class MetricsCache:
+    """Glyph metrics, kept in memory and on disk.
+
+    Metrics are stored under a hash of whatever they were measured from
+    (see ``GlyphMetricsTable.glyph_hash``), so entries can be shared between
+    fonts and between builds. On disk, entries are spread over 256 files by
+    the first two characters of their key, and ``flush()`` only rewrites the
+    files which have new entries.
+
+    Args:
+        cache_dir: Directory to store metrics in. If ``None``, nothing is
+            stored, and callers need not compute hashes at all.
+    """
+
+    VERSION = 2
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+        self._shards = {}
+        self._dirty = set()
+        self._pruned = False
+        self._lock = threading.Lock()
+
+    def _dir(self, version=None):
+        return os.path.join(self.cache_dir, "metrics-%i" % (version or self.VERSION))
+
+    def _path(self, shard):
+        return os.path.join(self._dir(), "%s.pickle" % shard)
+
+    def _shard(self, key):
+        shard = key[:2]
+        entries = self._shards.get(shard)
+        if entries is None:
+            entries = (self.cache_dir and _read_pickle(self._path(shard))) or {}
+            self._shards[shard] = entries
+        return shard, entries
+
+    def get(self, key):
+        """Return the metrics stored under ``key``, or ``None``."""
+        metrics = self._shard(key)[1].get(key)
+        if metrics is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return metrics
+
+    def put(self, key, metrics):
+        shard, entries = self._shard(key)
+        entries[key] = metrics
+        self._dirty.add(shard)
+
+    def prune(self):
+        """Remove metrics stored in the formats of older versions of FEZ."""
+        if not self.cache_dir:
+            return
+        _unlink(os.path.join(self.cache_dir, "metrics-1.pickle"))
+        for version in range(2, self.VERSION):
+            shutil.rmtree(self._dir(version), ignore_errors=True)
+
+    def flush(self):
+        """Write any new entries to the cache directory."""
+        with self._lock:
+            if not self.cache_dir:
+                self._dirty.clear()
+                return
+            if self._dirty and not self._pruned:
+                self._pruned = True
+                self.prune()
+            for shard in sorted(self._dirty):
+                # Keep entries other processes have written in the meantime.
+                merged = _read_pickle(self._path(shard)) or {}
+                merged.update(self._shards[shard])
+                _write_pickle(self.cache_dir, self._path(shard), merged)
+                self._shards[shard] = merged
+            self._dirty.clear()
+
+    def clear(self):
+        """Forget all cached metrics, in memory and in the cache directory."""
+        self._shards = {}
+        self._dirty = set()
+        if self.cache_dir:
+            shutil.rmtree(self._dir(), ignore_errors=True)
+
+
+def text_digest(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def grammar_digest(grammar, **kwargs):
+    """Return a hash identifying a grammar together with its Lark options."""
+    options = "".join("%s=%r" % (k, kwargs[k]) for k in sorted(kwargs))
+    return hashlib.sha256((grammar + "\n" + options).encode("utf-8")).hexdigest()
+
+
+class ParserRegistry:
+    """A thread-safe, process-wide store of compiled parsers.
+
+    Parsers are stored under a key such as ``(module, verb, digest)``. When
+    several threads ask for the same key at once, only one of them builds the
+    parser and the others wait for it.
+    """
+
+    def __init__(self):
+        self._parsers = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        self.builds = 0
+
+    def get(self, key, build):
+        """Return the parser stored under ``key``, calling ``build()`` to make it if needed."""
+        try:
+            return self._parsers[key]
+        except KeyError:
+            pass
+        with self._lock:
+            keylock = self._locks.setdefault(key, threading.Lock())
+        with keylock:
+            if key not in self._parsers:
+                self._parsers[key] = build()
+                with self._lock:
+                    self.builds += 1
+            return self._parsers[key]
+
+    def __contains__(self, key):
+        return key in self._parsers
+
+    def __len__(self):
+        return len(self._parsers)
+
+    def clear(self):
+        with self._lock:
+            self._parsers.clear()
+            self._locks.clear()
+
+
+REGISTRY = ParserRegistry()
@@ -0,0 +1,378 @@
+"""
+Glyph index
+===========
+
+Resolving glyph selectors means checking glyph names against the font's
+glyph set over and over again. Asking the font for its exported glyphs
+builds a fresh list each time, and testing membership in that list is
+linear, so a ``GlyphIndex`` keeps the exported glyph names of a font as a
+tuple (in font order), a frozenset, and a map from name to position.
+
+There is one index per font, shared by every ``FezParser`` using it. The
+index rebuilds itself when glyphs are added to or removed from the font,
+and when a verb marks the font as modified (``parser.font_modified = True``).
+Renaming a glyph or changing whether it is exported keeps the glyph count,
+so this is only noticed when the names are checked, which ``FezParser``
+does each time it starts running verbs (``refresh(check_names=True)``).
+Code which changes ``font.glyphs`` in the middle of a verb should call the
+index's ``invalidate()``. Each rebuild increases its ``generation``, so
+that anything derived from the glyph set can tell when it is out of date.
+
+The index also answers regular expression selectors (``/^a\\./``). Compiled
+patterns are kept in a small LRU cache, and the glyphs matching each pattern
+are remembered until the index is rebuilt. In large fonts, patterns are run
+once over all the glyph names joined by newlines rather than once per name.
+The same goes for substitutions, which ``hasglyph()`` predicates make in
+every glyph name.
+
+Unicode selectors are answered from the index's own character map, which
+keeps its codepoints in a sorted array so that a range such as
+``U+4E00=>U+9FFF`` is found with two binary searches.
+
+Suffix selectors (``@bases.alt``, ``@inits~init``) are looked up in tables
+mapping each glyph to its suffixed variant, or back to its base glyph,
+which are built once per suffix.
+
+Finally, a ``GlyphClass`` is a set of glyphs of an index held as a bitmask
+of glyph IDs, so that classes can be combined with ``|``, ``&`` and ``-``
+without building Python sets, and always list their glyphs in font order.
+"""
+
+import array
+import bisect
+import functools
+import re
+import weakref
+
+_indexes = {}
+
+# Fonts with at least this many glyphs are matched against the joined names.
+BATCH_THRESHOLD = 512
+
+# Constructs which can see past the end of a line, and so would give
+# different answers on the joined names than on each name by itself.
+_UNBATCHABLE = re.compile(r"\\[AZ]|\(\?<?[=!]")
+
+
+@functools.lru_cache(maxsize=256)
+def compile_regex(regex, flags=0):
+    """Compile a regular expression, remembering recently used patterns."""
+    return re.compile(regex, flags)
+
+
+class GlyphIndex:
+    """The exported glyphs of a font.
+
+    Attributes:
+        names: A tuple of glyph names, in the font's glyph order.
+        name_set: A frozenset of the same names.
+        ids: A dictionary mapping each name to its position in ``names``.
+        cmap: A dictionary mapping codepoints to glyph names.
+        generation: A counter which increases whenever the index is rebuilt.
+    """
+
+    def __init__(self, font):
+        self.font = font
+        self.generation = 0
+        self._build()
+
+    def _build(self):
+        self.names = tuple(self.font.exportedGlyphs())
+        self.name_set = frozenset(self.names)
+        self.ids = {name: i for i, name in enumerate(self.names)}
+        self._glyph_count = len(self.font.glyphs)
+        self._stale = False
+        self._matches = {}
+        self._substitutions = {}
+        self._blob = None
+        self._cmap = None
+        self._variants = {}
+        self._bases = {}
+        self._metrics = None
+
+    def invalidate(self):
+        """Mark the index as out of date; it is rebuilt when next used."""
+        self._stale = True
+
+    def refresh(self, check_names=False):
+        """Rebuild the index if it is out of date.
+
+        With ``check_names``, the font's exported glyph names are also
+        compared with the index's, which catches renamed glyphs and changed
+        export flags but takes time in proportion to the number of glyphs.
+        """
+        if (
+            self._stale
+            or len(self.font.glyphs) != self._glyph_count
+            or (check_names and tuple(self.font.exportedGlyphs()) != self.names)
+        ):
+            self._build()
+            self.generation += 1
+        return self
+
+    def metrics(self, cache=None):
+        """Return the ``GlyphMetricsTable`` of the font; see ``fez.metrics``.
+
+        ``cache`` is a ``MetricsCache`` for the table to use, if it has to be
+        made.
+        """
+        if self._metrics is None:
+            from .metrics import GlyphMetricsTable
+
+            self._metrics = GlyphMetricsTable(self, cache)
+        return self._metrics
+
+    def _build_cmap(self):
+        cmap = {}
+        for glyph in self.font.glyphs:
+            for u in glyph.codepoints or ():
+                if u:
+                    cmap[u] = glyph.name
+        codepoints = sorted(cmap)
+        self._cmap = cmap
+        self._codepoints = array.array("L", codepoints)
+        self._cmap_names = tuple(cmap[u] for u in codepoints)
+
+    @property
+    def cmap(self):
+        if self._cmap is None:
+            self._build_cmap()
+        return self._cmap
+
+    def unicode_range(self, first, last):
+        """Return a tuple of the glyphs mapped to codepoints from ``first``
+        to ``last`` inclusive, in codepoint order."""
+        if self._cmap is None:
+            self._build_cmap()
+        lo = bisect.bisect_left(self._codepoints, first)
+        hi = bisect.bisect_right(self._codepoints, last)
+        return self._cmap_names[lo:hi]
+
+    def match(self, regex):
+        """Return a tuple of the glyph names in which ``regex`` is found.
+
+        ``regex`` is a string, as in ``re.search(regex, name)``. Raises
+        ``re.error`` if it is not a valid regular expression.
+        """
+        matched = self._matches.get(regex)
+        if matched is None:
+            pattern = compile_regex(regex)
+            if len(self.names) >= BATCH_THRESHOLD and not _UNBATCHABLE.search(regex):
+                matched = self._match_batched(regex)
+            if matched is None:
+                matched = tuple(g for g in self.names if pattern.search(g))
+            self._matches[regex] = matched
+        return matched
+
+    def _joined(self):
+        if self._blob is None:
+            self._blob = "\n".join(self.names)
+            starts, offset = [], 0
+            for name in self.names:
+                starts.append(offset)
+                offset += len(name) + 1
+            self._starts = starts
+        return self._blob
+
+    def _match_batched(self, regex):
+        """Match against the newline-joined names, or return ``None`` if a
+        match runs across names and so the result cannot be trusted."""
+        blob = self._joined()
+        pattern = compile_regex(regex, re.MULTILINE)
+        hits = []
+        last = -1
+        for m in pattern.finditer(blob):
+            if "\n" in m.group():
+                return None
+            i = bisect.bisect_right(self._starts, m.start()) - 1
+            if i != last:
+                hits.append(i)
+                last = i
+        return tuple(self.names[i] for i in hits)
+
+    def substitute(self, regex, replacement):
+        """Return a tuple of every glyph name with ``regex`` replaced, as in
+        ``re.sub(regex, replacement, name)``, in the order of ``names``.
+        """
+        key = (regex, replacement)
+        substituted = self._substitutions.get(key)
+        if substituted is None:
+            pattern = compile_regex(regex)
+            if len(self.names) >= BATCH_THRESHOLD and not _UNBATCHABLE.search(regex):
+                substituted = self._substitute_batched(regex, replacement)
+            if substituted is None:
+                substituted = tuple(pattern.sub(replacement, g) for g in self.names)
+            self._substitutions[key] = substituted
+        return substituted
+
+    def _substitute_batched(self, regex, replacement):
+        """Substitute in the newline-joined names, or return ``None`` if a
+        match runs across names or the replacement adds a newline."""
+        blob = self._joined()
+        pattern = compile_regex(regex, re.MULTILINE)
+        if any("\n" in m.group() for m in pattern.finditer(blob)):
+            return None
+        substituted = pattern.sub(replacement, blob).split("\n")
+        if len(substituted) != len(self.names):
+            return None
+        return tuple(substituted)
+
+    def variants(self, suffix):
+        """Return a dictionary mapping base names to their ``.suffix``
+        variants, for every variant in the index."""
+        variants = self._variants.get(suffix)
+        if variants is None:
+            tail = "." + suffix
+            variants = {
+                name[: -len(tail)]: name for name in self.names if name.endswith(tail)
+            }
+            self._variants[suffix] = variants
+        return variants
+
+    def bases(self, suffix):
+        """Return a dictionary mapping every name in the index to the name
+        with any ``.suffix`` ending removed."""
+        bases = self._bases.get(suffix)
+        if bases is None:
+            tail = "." + suffix
+            bases = {
+                name: name[: -len(tail)] if name.endswith(tail) else name
+                for name in self.names
+            }
+            self._bases[suffix] = bases
+        return bases
+
+    def apply_suffix(self, names, suffixtype, suffix):
+        """Add (``.``) or remove (``~``) a suffix on each of the glyph names.
+
+        Names which are not in the index are changed in the same way, so
+        that missing glyphs can still be reported.
+        """
+        if suffixtype == ".":
+            variants = self.variants(suffix)
+            return [variants.get(name) or name + "." + suffix for name in names]
+        bases = self.bases(suffix)
+        tail = "." + suffix
+        return [
+            bases.get(name) or (name[: -len(tail)] if name.endswith(tail) else name)
+            for name in names
+        ]
+
+    def mask(self, names):
+        """Return an integer with the bit of each named glyph's ID set.
+
+        Raises ``KeyError`` if a glyph is not in the index.
+        """
+        ids = self.ids
+        bits = bytearray((len(self.names) + 7) // 8)
+        for name in names:
+            i = ids[name]
+            bits[i >> 3] |= 1 << (i & 7)
+        return int.from_bytes(bits, "little")
+
+    def names_from_mask(self, mask):
+        """Return a tuple of the glyphs whose bits are set, in font order."""
+        names = self.names
+        data = mask.to_bytes((len(names) + 7) // 8, "little")
+        return tuple(
+            names[(i << 3) + j]
+            for i, byte in enumerate(data)
+            if byte
+            for j in range(8)
+            if byte >> j & 1
+        )
+
+    def __contains__(self, name):
+        return name in self.name_set
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+
+class GlyphClass:
+    """A set of glyphs from a ``GlyphIndex``, stored as a bitmask.
+
+    Classes from the same index can be combined with ``|`` (union), ``&``
+    (intersection) and ``-`` (difference). The glyph names are only worked
+    out when ``names`` is first used, and are always in font order.
+
+    A mask only means something for the glyph set it was made from, so a
+    class remembers the ``generation`` of its index. Once the index has been
+    rebuilt, using the mask (combining the class, or working out names it
+    has not already worked out) raises ``ValueError``.
+    """
+
+    __slots__ = ("index", "mask", "generation", "_names")
+
+    def __init__(self, index, mask=0):
+        self.index = index
+        self.mask = mask
+        self.generation = index.generation
+        self._names = None
+
+    @classmethod
+    def from_names(cls, index, names):
+        if isinstance(names, GlyphClass):
+            return names
+        return cls(index, index.mask(names))
+
+    @property
+    def names(self):
+        if self._names is None:
+            self._check()
+            self._names = self.index.names_from_mask(self.mask)
+        return self._names
+
+    def _check(self):
+        if self.generation != self.index.generation:
+            raise ValueError("Glyph class is out of date: the font's glyphs have changed")
+
+    def _combine(self, other, mask):
+        if other.index is not self.index:
+            raise ValueError("Cannot combine glyph classes of different fonts")
+        self._check()
+        other._check()
+        return GlyphClass(self.index, mask)
+
+    def __or__(self, other):
+        return self._combine(other, self.mask | other.mask)
+
+    def __and__(self, other):
+        return self._combine(other, self.mask & other.mask)
+
+    def __sub__(self, other):
+        return self._combine(other, self.mask & ~other.mask)
+
+    def __contains__(self, name):
+        self._check()
+        i = self.index.ids.get(name)
+        return i is not None and bool(self.mask >> i & 1)
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return bin(self.mask).count("1")
+
+    def __repr__(self):
+        return "GlyphClass<%s>" % " ".join(self.names)
+
+
+def glyph_index(font):
+    """Return the up-to-date ``GlyphIndex`` for a font."""
+    entry = _indexes.get(id(font))
+    if entry is not None and entry[0]() is font:
+        return entry[1].refresh()
+    index = GlyphIndex(font)
+    key = id(font)
+
+    def forget(ref, indexes=_indexes):
+        # A new font may have been given the same id in the meantime.
+        if indexes.get(key, (None,))[0] is ref:
+            del indexes[key]
+
+    _indexes[key] = (weakref.ref(font, forget), index)
+    return index
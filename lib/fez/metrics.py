@@ -0,0 +1,222 @@
+"""
+Glyph metrics
+=============
+
+Predicates such as ``width < 200`` and values such as ``width(space)`` need
+the metrics of glyphs, and working them out means measuring glyph outlines.
+A ``GlyphMetricsTable`` works out the metrics of each glyph at most once, and
+can lay out any metric of all the font's exported glyphs as a NumPy array.
+
+Each ``GlyphIndex`` owns a table (``parser.glyph_metrics``), which is thrown
+away whenever the index is rebuilt; verbs which change glyphs, such as
+``SetWidth``, mark the font as modified so that this happens.
+
+Given a ``MetricsCache`` with a cache directory, the table also looks up
+metrics by a hash of each glyph's layers, so that later builds of the same
+source only measure the glyphs which have changed.
+
+For multiple master fonts, the table can also measure every master and
+hold the results as one array of shape (masters, glyphs, metrics), so that
+predicates and binning can look at all masters at once.
+"""
+
+import glyphtools
+import numpy as np
+from glyphtools import get_glyph_metrics
+
+from . import TESTVALUE_METRICS
+from .binning import bin_values
+from .cache import text_digest
+
+
+class GlyphMetricsTable:
+    """The metrics of a font's glyphs.
+
+    Args:
+        index: The ``GlyphIndex`` of the font.
+        cache: An optional ``MetricsCache``.
+    """
+
+    def __init__(self, index, cache=None):
+        self.index = index
+        self.font = index.font
+        self._rows = {}
+        self._columns = None
+        self._hashes = {}
+        self._masters = None
+        self._tensor = None
+        self._bins = {}
+        self.cache = None
+        # Only babelfont fonts can be hashed.
+        if cache is not None and cache.cache_dir and hasattr(self.font, "default_master"):
+            self.cache = cache
+
+    def get(self, glyphname):
+        """Return a dictionary of the metrics of a glyph."""
+        row = self._rows.get(glyphname)
+        if row is None:
+            key = None
+            if self.cache is not None:
+                key = self.glyph_hash(glyphname)
+                row = self.cache.get(key)
+            if row is None:
+                row = get_glyph_metrics(self.font, glyphname)
+                if key is not None:
+                    self.cache.put(key, row)
+            self._rows[glyphname] = row
+        return row
+
+    def glyph_hash(self, glyphname):
+        """Return a hash of everything a glyph's metrics depend on: the width,
+        anchors and outlines of its master layers, its components' glyphs,
+        and the version of glyphtools and list of metrics measuring them."""
+        digest = self._hashes.get(glyphname)
+        if digest is None:
+            self._hashes[glyphname] = ""  # in case of a component loop
+            default = self.font.default_master
+            parts = [getattr(glyphtools, "__version__", None), TESTVALUE_METRICS]
+            for master in self.font.masters:
+                layer = master.get_glyph_layer(glyphname)
+                if layer is None:
+                    continue
+                parts.append((
+                    _master_name(master),
+                    master is default,
+                    layer.width,
+                    [(a.name, a.x, a.y) for a in layer.anchors],
+                ))
+                for shape in layer.shapes:
+                    if shape.ref:
+                        parts.append((shape.ref, shape.transform, self.glyph_hash(shape.ref)))
+                    else:
+                        parts.append((shape.closed, [(n.x, n.y, n.type) for n in shape.nodes]))
+            digest = self._hashes[glyphname] = text_digest(repr(parts))
+        return digest
+
+    def value(self, glyphname, metric):
+        """Return one metric of a glyph."""
+        if metric not in TESTVALUE_METRICS:
+            raise ValueError("Unknown metric '%s'" % metric)
+        return self.get(glyphname)[metric]
+
+    def column(self, metric, master=None):
+        """Return an array of a metric for every glyph in the index, in the
+        order of ``index.names``.
+
+        The metric is taken from the default master, unless ``master`` gives
+        the index or name of another one.
+        """
+        if metric not in TESTVALUE_METRICS:
+            raise ValueError("Unknown metric '%s'" % metric)
+        if master is not None:
+            return self.tensor[self.master_index(master), :, TESTVALUE_METRICS.index(metric)]
+        if self._columns is None:
+            rows = [self.get(g) for g in self.index.names]
+            self._columns = {
+                m: np.array([row[m] for row in rows], dtype=float)
+                for m in TESTVALUE_METRICS
+            }
+            if self.cache is not None:
+                self.cache.flush()
+        return self._columns[metric]
+
+    @property
+    def masters(self):
+        """The font's masters, or ``[None]`` for a font without masters."""
+        if self._masters is None:
+            if hasattr(self.font, "default_master"):
+                self._masters = list(self.font.masters)
+            else:
+                self._masters = [None]
+        return self._masters
+
+    def master_index(self, master):
+        """Return the position in ``masters`` of a master given by position
+        or by name."""
+        if isinstance(master, int):
+            if not 0 <= master < len(self.masters):
+                raise ValueError("No master number %i" % master)
+            return master
+        for i, m in enumerate(self.masters):
+            if m is not None and _master_name(m) == master:
+                return i
+        raise ValueError("Unknown master '%s'" % master)
+
+    def _master_row(self, master, glyphname):
+        if master is None or master is self.font.default_master:
+            return self.get(glyphname)
+        if master.get_glyph_layer(glyphname) is None:
+            # A sparse master; the default master is the best guess we have.
+            return self.get(glyphname)
+        key = None
+        if self.cache is not None:
+            key = "%s/%s" % (self.glyph_hash(glyphname), _master_name(master))
+            row = self.cache.get(key)
+            if row is not None:
+                return row
+        row = get_glyph_metrics(master, glyphname)
+        if key is not None:
+            self.cache.put(key, row)
+        return row
+
+    @property
+    def tensor(self):
+        """An array of shape (masters, glyphs, metrics) holding every metric
+        of every glyph in the index in every master. Glyphs are in the order
+        of ``index.names`` and metrics in the order of ``TESTVALUE_METRICS``."""
+        if self._tensor is None:
+            self._tensor = np.array(
+                [
+                    [
+                        [row[m] for m in TESTVALUE_METRICS]
+                        for row in (self._master_row(master, g) for g in self.index.names)
+                    ]
+                    for master in self.masters
+                ],
+                dtype=float,
+            ).reshape(len(self.masters), len(self.index.names), len(TESTVALUE_METRICS))
+            if self.cache is not None:
+                self.cache.flush()
+        return self._tensor
+
+    def master_columns(self, metric):
+        """Return an array of shape (masters, glyphs) of a metric."""
+        if metric not in TESTVALUE_METRICS:
+            raise ValueError("Unknown metric '%s'" % metric)
+        return self.tensor[:, :, TESTVALUE_METRICS.index(metric)]
+
+    def bin(self, glyphs, metric, bincount=5, master=None):
+        """Organise glyphs into ``bincount`` bins of similar ``metric``.
+
+        The metric is taken from the default master, unless ``master`` is
+        the index or name of another master, or ``"min"`` or ``"max"`` to
+        use each glyph's smallest or largest value across all masters.
+
+        Returns a list of ``(glyphs, mean value)`` tuples like
+        ``glyphtools.bin_glyphs_by_metric``; see ``fez.binning``. The list is
+        shared by every caller asking for the same bins, and must not be
+        changed.
+        """
+        glyphs = tuple(glyphs)
+        key = (glyphs, metric, bincount, master)
+        binned = self._bins.get(key)
+        if binned is not None:
+            return binned
+        if master is None:
+            values = {g: self.value(g, metric) for g in glyphs}
+        else:
+            ids = [self.index.ids[g] for g in glyphs]
+            if master in ("min", "max"):
+                column = getattr(self.master_columns(metric)[:, ids], master)(axis=0)
+            else:
+                column = self.column(metric, master)[ids]
+            values = dict(zip(glyphs, column.tolist()))
+        binned = self._bins[key] = bin_values(values, bincount)
+        return binned
+
+
+def _master_name(master):
+    name = master.name
+    if isinstance(name, dict):
+        return name.get_default() if hasattr(name, "get_default") else name.get("dflt")
+    return name
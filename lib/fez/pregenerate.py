@@ -0,0 +1,157 @@
+"""
+Pregenerating parsers
+=====================
+
+Writes the ``fez/parsers`` directory, which holds the loaded grammars of the
+built-in plugins and, for LALR mode, their LALR parsers. ``FezParser`` uses
+these instead of compiling the grammars itself; grammars from other plugins
+loaded with ``LoadPlugin`` are still compiled (and cached) when first used.
+
+The directory contains a ``manifest.json`` listing, for each grammar, the
+plugin verbs which use it, the hashes it is looked up by, and the files
+holding it: ``<name>.lalr``, a LALR parser written by ``Lark.save``, and
+``<name>.grammar``, the grammar as loaded by Lark for the Earley parser
+(pickled, as in the ``ParserCache``, since Lark has no saved form for
+Earley parsers).
+
+Run this after changing any built-in grammar, or when upgrading Lark::
+
+    python -m fez.pregenerate
+
+``python -m fez.pregenerate --check`` (``make check-parsers``) regenerates
+the manifest without writing anything and fails if it differs from the one
+in the package.
+
+Lark's own standalone generator only supports LALR parsers and copies the
+whole Lark runtime into its output, so it cannot be used for the Earley
+parsers which FEZ uses by default.
+"""
+
+import argparse
+import json
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+
+import lark
+from lark.load_grammar import load_grammar
+
+from . import FezParser, HELPERS, GRAMMAR, _compile_lalr
+from .cache import PREGENERATED_DIR, ParserCache, grammar_digest, text_digest
+
+MANIFEST = "manifest.json"
+
+
+def grammar_sources(parser):
+    """Yield a description and the text of every grammar the built-in
+    plugins use."""
+    yield "fez", HELPERS + GRAMMAR
+    for name, verb in parser.plugins.items():
+        yield "%s %s" % (verb.module, name), verb.rules + (verb.grammar or "")
+        for kind, grammar in (("before brace", verb.bbgrammar), ("after brace", verb.abgrammar)):
+            if grammar:
+                yield "%s %s (%s)" % (verb.module, name, kind), verb.rules + grammar
+
+
+def generate(directory=PREGENERATED_DIR, write=True):
+    """Write the grammars and LALR parsers of the built-in plugins, and their
+    manifest, into ``directory``. Returns the manifest.
+
+    With ``write=False``, only the manifest is worked out.
+    """
+    parser = FezParser(None)
+    cache = ParserCache(None)
+    entries = {}
+    for used_by, text in grammar_sources(parser):
+        digest = text_digest(text)
+        entry = entries.get(digest)
+        if entry is None:
+            name = digest[:16]
+            compiled = _compile_lalr(cache, text, parser.lark_kwargs)
+            entry = entries[digest] = {
+                "used_by": [],
+                "grammar": digest,
+                "grammar_file": name + ".grammar",
+                "lalr": grammar_digest(text, **parser.lark_kwargs),
+                "lalr_file": None if compiled is None else name + ".lalr",
+            }
+            if write:
+                with open(os.path.join(directory, entry["grammar_file"]), "wb") as f:
+                    pickle.dump(load_grammar(text, "<string>", None, False)[0], f, protocol=4)
+                if compiled is not None:
+                    with open(os.path.join(directory, entry["lalr_file"]), "wb") as f:
+                        compiled.save(f)
+        entry["used_by"].append(used_by)
+
+    manifest = {
+        "generated_by": "python -m fez.pregenerate",
+        "lark_version": lark.__version__,
+        "lark_options": parser.lark_kwargs,
+        "parsers": list(entries.values()),
+    }
+    if write:
+        with open(os.path.join(directory, MANIFEST), "w") as f:
+            json.dump(manifest, f, indent=1)
+            f.write("\n")
+    return manifest
+
+
+def check(directory=PREGENERATED_DIR):
+    """Return a list of the ways the pregenerated parsers in ``directory``
+    differ from those ``generate`` would write; empty if they are current."""
+    try:
+        with open(os.path.join(directory, MANIFEST)) as f:
+            shipped = json.load(f)
+    except (OSError, ValueError) as e:
+        return ["cannot read %s: %s" % (MANIFEST, e)]
+    expected = generate(write=False)
+    problems = []
+    if shipped.get("lark_version") != expected["lark_version"]:
+        problems.append(
+            "generated with Lark %s, not %s" % (shipped.get("lark_version"), expected["lark_version"])
+        )
+    if shipped.get("lark_options") != expected["lark_options"]:
+        problems.append("generated with different Lark options")
+    shipped_entries = {e["grammar"]: e for e in shipped.get("parsers", [])}
+    for entry in expected["parsers"]:
+        found = shipped_entries.pop(entry["grammar"], None)
+        if found != entry:
+            problems.append("%s: %s" % (", ".join(entry["used_by"]), "changed" if found else "missing"))
+        for key in ("grammar_file", "lalr_file"):
+            if entry[key] and not os.path.exists(os.path.join(directory, entry[key])):
+                problems.append("%s: no file %s" % (", ".join(entry["used_by"]), entry[key]))
+    for entry in shipped_entries.values():
+        problems.append("%s: no longer used" % ", ".join(entry["used_by"]))
+    return problems
+
+
+def main():
+    argparser = argparse.ArgumentParser(description="Pregenerate parsers for FEZ's built-in plugins")
+    argparser.add_argument("--check", action="store_true",
+                           help="Fail if the pregenerated parsers are out of date, instead of writing them")
+    args = argparser.parse_args()
+
+    if args.check:
+        problems = check()
+        if problems:
+            print("Pregenerated parsers in %s are out of date (run make parsers):" % PREGENERATED_DIR)
+            for problem in problems:
+                print("  " + problem)
+            sys.exit(1)
+        print("Pregenerated parsers are current")
+        return
+
+    # Write into a fresh directory and move it into place, so that files of
+    # grammars which are no longer used do not linger.
+    tmpdir = tempfile.mkdtemp(dir=os.path.dirname(PREGENERATED_DIR), prefix=".parsers-")
+    os.chmod(tmpdir, 0o755)
+    generate(tmpdir)
+    shutil.rmtree(PREGENERATED_DIR, ignore_errors=True)
+    os.rename(tmpdir, PREGENERATED_DIR)
+    print("Wrote %s" % PREGENERATED_DIR)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Selector caching
+================
+
+Verbs resolve the same glyph selectors (``@medis``, ``/\\.init$/``) over and
+over again. ``FezParser`` keeps its named classes and its variables in
+``GenerationDict`` objects, which count how many times they have been
+changed, and the named classes carry a ``SelectorCache`` which remembers the
+glyphs each selector resolved to.
+
+A cached resolution is keyed by the selector's text together with the
+generation of the font's glyph index and of any variables the selector
+uses. The whole cache is emptied when a named class is defined or
+redefined, or when selectors are resolved against the glyph index of a
+different font. Resolved glyphs are stored as tuples, and each caller of
+``GlyphSelector.resolve`` gets its own list of them. Changing a class's list
+of glyphs in place, rather than assigning a new one, is not noticed.
+"""
+
+import weakref
+
+
+class GenerationDict(dict):
+    """A dictionary which counts how many times it has been changed."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.generation = 0
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.generation += 1
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self.generation += 1
+
+    def clear(self):
+        super().clear()
+        self.generation += 1
+
+    def pop(self, *args):
+        self.generation += 1
+        return super().pop(*args)
+
+    def popitem(self):
+        self.generation += 1
+        return super().popitem()
+
+    def setdefault(self, key, default=None):
+        self.generation += 1
+        return super().setdefault(key, default)
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self.generation += 1
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+
+class NamedClasses(GenerationDict):
+    """The named glyph classes of a ``FontFeatures`` object.
+
+    Attributes:
+        selector_cache: The ``SelectorCache`` for selectors resolved against
+            these classes.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.selector_cache = SelectorCache(self)
+
+
+class SelectorCache:
+    """Glyph selector resolutions, valid for one generation of named classes.
+
+    Attributes:
+        hits: The number of resolutions answered from the cache.
+        misses: The number of resolutions which had to be computed.
+    """
+
+    def __init__(self, classes):
+        self.classes = classes
+        self.hits = 0
+        self.misses = 0
+        self._generation = classes.generation
+        self._index = None
+        self._results = {}
+
+    def get(self, key, compute, index=None):
+        """Return the result stored under ``key``, calling ``compute()`` to
+        make it if needed.
+
+        ``index`` is the ``GlyphIndex`` the result is resolved against; it
+        is held weakly, and results for any other index are forgotten.
+        """
+        if self.classes.generation != self._generation:
+            self._results.clear()
+            self._generation = self.classes.generation
+        if index is not None and (self._index is None or self._index() is not index):
+            self._results.clear()
+            self._index = weakref.ref(index)
+        try:
+            result = self._results[key]
+        except KeyError:
+            self.misses += 1
+            result = self._results[key] = compute()
+            return result
+        self.hits += 1
+        return result
+
+    def clear(self):
+        """Forget all cached resolutions."""
+        self._results.clear()
+
+    def __len__(self):
+        return len(self._results)
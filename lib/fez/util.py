@@ -1,7 +1,7 @@
 import functools
 
 def compare(l, token, r):
-    if not r: return bool(l)
+    if r is None: return bool(l)
     comparator_tokens = [">=", "<=", "==", "<", ">"]
     comparator_attrs = ["__ge__", "__le__", "__eq__", "__lt__", "__gt__"]
     comparators = dict(zip(comparator_tokens, comparator_attrs))
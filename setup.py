@@ -35,6 +35,7 @@ config = {
     'package_dir': {'': 'lib'},
     'packages': find_packages('lib')
 ,
+    'package_data': {'fez': ['parsers/*']},
     'scripts': scripts,
     'zip_safe': False
 }
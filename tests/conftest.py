@@ -0,0 +1,14 @@
+import pytest
+
+
+@pytest.fixture(autouse=True, scope="session")
+def fez_cache_dir(tmp_path_factory):
+    """Keep FEZ's on-disk caches, in this process and in any it starts, out of
+    the developer's own cache directory."""
+    from fez import set_cache_dir
+
+    path = str(tmp_path_factory.mktemp("fez-cache"))
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("FEZ_CACHE_DIR", path)
+        set_cache_dir(path)
+        yield path
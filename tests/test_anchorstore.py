@@ -0,0 +1,160 @@
+from fez import FezParser
+from fez.anchorstore import AnchorStore
+from babelfont import Font, Glyph
+
+
+def test_index_follows_changes():
+    anchors = AnchorStore()
+    anchors["A"] = {"top": (100, 700), "bottom": (100, 0)}
+    anchors.setdefault("B", {})["top"] = (200, 700)
+    anchors["acutecomb"] = {"_top": (0, 500)}
+    assert dict(anchors.glyphs_with("top")) == {"A": (100, 700), "B": (200, 700)}
+
+    anchors["A"]["top"] = (150, 700)
+    del anchors["B"]["top"]
+    assert dict(anchors.glyphs_with("top")) == {"A": (150, 700)}
+
+    # Assigning one glyph's anchors to another copies them
+    anchors["C"] = anchors["A"]
+    anchors["A"].pop("bottom")
+    assert dict(anchors.glyphs_with("bottom")) == {"C": (100, 0)}
+
+    anchors["C"] = {"_top": (10, 500)}
+    del anchors["acutecomb"]
+    assert dict(anchors.glyphs_with("_top")) == {"C": (10, 500)}
+    assert dict(anchors.glyphs_with("bottom")) == {}
+
+
+def test_copied_anchors_are_independent():
+    font = Font()
+    for name in ["A", "B"]:
+        font.glyphs.append(Glyph(name=name, category="base"))
+    parser = FezParser(font)
+    parser.parseString("""
+        Anchors A top <100 700> bottom <100 0>;
+        LoadPlugin CopyAnchors;
+        CopyAnchors A B;
+    """)
+    anchors = parser.fontfeatures.anchors
+    assert anchors["B"] == {"top": (100, 700), "bottom": (100, 0)}
+    assert anchors["B"] is not anchors["A"]
+
+    parser.parseString("Anchors A top <150 700>;")
+    del anchors["A"]["bottom"]
+    assert anchors["B"] == {"top": (100, 700), "bottom": (100, 0)}
+    assert dict(anchors.glyphs_with("top")) == {"A": (150, 700), "B": (100, 700)}
+    assert dict(anchors.glyphs_with("bottom")) == {"B": (100, 0)}
+
+
+def test_hasanchor():
+    font = Font()
+    for name, category in [("A", "base"), ("B", "base"), ("acutecomb", "mark"), ("gravecomb", "mark")]:
+        font.glyphs.append(Glyph(name=name, category=category))
+    parser = FezParser(font)
+    parser.parseString("""
+        Anchors A top <679 1600> bottom <691 0>;
+        Anchors B top <611 1612>;
+        Anchors acutecomb _top <-570 1290> top <-570 1650>;
+        Anchors gravecomb _top <-542 1256>;
+        DefineClass @topmarks = hasanchor(_top);
+        DefineClass @bottoms = hasanchor(bottom) | hasanchor(_bottom);
+    """)
+    classes = parser.fontfeatures.namedClasses
+    assert classes["topmarks"] == ("acutecomb", "gravecomb")
+    assert classes["bottoms"] == ("A",)
+
+    del parser.fontfeatures.anchors["gravecomb"]
+    parser.parseString("DefineClass @topmarks = hasanchor(_top);")
+    assert classes["topmarks"] == ("acutecomb",)
+
+
+def test_attach_categories_are_shared():
+    from fez.Anchors import glyph_categories
+
+    font = Font()
+    font.glyphs.append(Glyph(name="A", category="base"))
+    font.glyphs.append(Glyph(name="dot", category="base"))
+    parser = FezParser(font)
+    categories = glyph_categories(parser)
+    assert categories["dot"] == "base"
+    assert glyph_categories(parser) is categories
+
+    parser.parseString("LoadPlugin FontEngineering; SetCategory dot mark;")
+    assert glyph_categories(parser) is not categories
+    assert glyph_categories(parser)["dot"] == "mark"
+
+
+def test_attach_follows_anchor_order(monkeypatch):
+    import fontFeatures
+
+    attached = []
+    monkeypatch.setattr(fontFeatures, "Attachment", lambda *args, **kwargs: attached.append(args))
+    font = Font()
+    for name, category in [("A", "base"), ("B", "base"), ("acutecomb", "mark"), ("gravecomb", "mark")]:
+        font.glyphs.append(Glyph(name=name, category=category))
+    parser = FezParser(font)
+    parser.parseString("""
+        Anchors A top <679 1600>;
+        Anchors B top <611 1612>;
+        Anchors acutecomb _top <-570 1290>;
+        Anchors gravecomb _top <-542 1256>;
+    """)
+    # Redefining moves A and acutecomb to the end of the anchor index
+    anchors = parser.fontfeatures.anchors
+    anchors["A"] = {"top": (680, 1600)}
+    anchors["acutecomb"] = {"_top": (-570, 1300)}
+    parser.parseString("Feature mark { Attach &top &_top bases; };")
+    _, _, _, bases, marks = attached[0]
+    assert list(bases) == ["A", "B"]
+    assert list(marks) == ["acutecomb", "gravecomb"]
+
+
+def test_load_anchors_from_masters():
+    from babelfont import Anchor, Axis, Layer, Master
+    from fontTools.feaLib.variableScalar import VariableScalar
+
+    font = Font()
+    font.axes = [Axis(name="Weight", tag="wght", min=100, max=900, default=100)]
+    font.masters = [
+        Master(name="Light", id="light", location={"wght": 100}, font=font),
+        Master(name="Bold", id="bold", location={"wght": 900}, font=font),
+    ]
+    anchors = {
+        "a": {"light": [("top", 250, 500)], "bold": [("top", 250, 500)]},
+        "b": {"light": [("top", 200, 700), ("bottom", 200, 0)], "bold": [("top", 240, 720), ("bottom", 200, 0)]},
+        "c": {"light": [("_top", 0, 500)], "bold": []},
+        "d": {"light": [("top", 300, 700)]},  # no layer in the Bold master
+        "e": {"light": [("top", 100, 700)], "bold": [("top", 120, 700)]},
+        "f": {"light": [("top", 100.5, 700)], "bold": [("top", 100.5, 720.5)]},
+    }
+    for name, layers in anchors.items():
+        glyph = Glyph(name=name)
+        for master, glyph_anchors in layers.items():
+            layer = Layer(width=500, _master=master, _font=font)
+            layer.anchors = [Anchor(name=a, x=x, y=y) for a, x, y in glyph_anchors]
+            glyph.layers.append(layer)
+        font.glyphs.append(glyph)
+
+    parser = FezParser(font)
+    parser.parseString("LoadAnchors;")
+    loaded = parser.fontfeatures.anchors
+    assert loaded["a"] == {"top": (250, 500)}
+    assert loaded["b"]["bottom"] == (200, 0)
+    assert loaded["d"] == {"top": (300, 700)}
+
+    x, y = loaded["b"]["top"]
+    assert isinstance(x, VariableScalar) and isinstance(y, VariableScalar)
+    assert sorted(x.values.values()) == [200, 240]
+    assert sorted(y.values.values()) == [700, 720]
+    # Missing from a master which has the glyph, so left to vary
+    assert isinstance(loaded["c"]["_top"][0], VariableScalar)
+    assert list(loaded["c"]["_top"][0].values.values()) == [0]
+    x, y = loaded["e"]["top"]
+    assert sorted(x.values.values()) == [100, 120]
+    assert y == 700
+    # Fractional coordinates are kept, whether or not they vary
+    x, y = loaded["f"]["top"]
+    assert x == 100.5
+    assert sorted(y.values.values()) == [700, 720.5]
+    assert isinstance(loaded["a"]["top"][0], int)
+    assert dict(loaded.glyphs_with("top")).keys() == {"a", "b", "d", "e", "f"}
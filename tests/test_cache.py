@@ -0,0 +1,253 @@
+from fez import HELPERS, GRAMMAR
+from fez.cache import ParserCache
+import os
+
+
+def test_parser_cache_roundtrip(tmp_path):
+    cache = ParserCache(str(tmp_path))
+    cold = cache.lark(HELPERS + GRAMMAR, propagate_positions=True)
+    assert cache.misses == 1
+    assert len(os.listdir(tmp_path)) == 1
+
+    warm = ParserCache(str(tmp_path))
+    parser = warm.lark(HELPERS + GRAMMAR, propagate_positions=True)
+    assert warm.hits == 1 and warm.misses == 0
+    s = "Substitute a -> b;"
+    assert parser.parse(s) == cold.parse(s)
+
+
+def test_parser_cache_disabled():
+    cache = ParserCache(None)
+    cache.lark(HELPERS + GRAMMAR)
+    cache.lark(HELPERS + GRAMMAR)
+    assert cache.misses == 2
+
+
+def test_parser_cache_prunes_other_versions(tmp_path):
+    old = tmp_path / "grammar-lark0.1-py2.7-abc.pickle"
+    old.write_bytes(b"")
+    (tmp_path / "tree-abc.pickle").write_bytes(b"")
+    cache = ParserCache(str(tmp_path))
+    cache.lark(HELPERS + GRAMMAR)
+    assert not old.exists()
+    entries = sorted(os.listdir(tmp_path))
+    assert entries[0].startswith("grammar-" + ParserCache.version_tag + "-")
+    assert entries[1:] == ["tree-abc.pickle"]
+
+
+def test_caches_are_opt_in(tmp_path):
+    import subprocess
+    import sys
+
+    code = (
+        "import os, fez\n"
+        "os.environ.update(FEZ_CACHE_DIR=os.environ.pop('CACHE_DIR', ''))\n"
+        "p = fez.FezParser(None)\n"
+        "print(p.cache.cache_dir, p.include_cache.cache_dir, p.metrics_cache.cache_dir)\n"
+    )
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    env.pop("FEZ_CACHE_DIR", None)
+    off = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True)
+    assert off.stdout.split() == ["None"] * 3
+    # Looked up when first used, not when fez is imported
+    env["CACHE_DIR"] = str(tmp_path)
+    on = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True)
+    assert on.stdout.split() == [str(tmp_path)] * 3
+
+
+def test_cache_dir_is_private(tmp_path):
+    import stat
+
+    cache_dir = tmp_path / "cache"
+    ParserCache(str(cache_dir)).lark(HELPERS + GRAMMAR)
+    assert stat.S_IMODE(cache_dir.stat().st_mode) & 0o077 == 0
+
+
+def test_registry_shares_parsers_across_threads():
+    from fez.cache import ParserRegistry
+    import threading
+    import time
+
+    registry = ParserRegistry()
+    built = []
+
+    def build():
+        time.sleep(0.05)
+        built.append(1)
+        return object()
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(registry.get(("m", "v", "x"), build)))
+        for _ in range(8)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(built) == 1
+    assert len(set(map(id, results))) == 1
+
+
+def test_tree_cache_skips_parse(tmp_path):
+    from fez.cache import TreeCache
+    from fez import FezParser
+
+    included = tmp_path / "classes.fez"
+    included.write_text("DefineClass @lower = /^[a-z]$/;\n")
+    parsed = []
+
+    def parse(s):
+        parsed.append(s)
+        return FezParser.parser.parse(s)
+
+    cache = TreeCache(str(tmp_path / "cache"))
+    tree = cache.tree(str(included), "key", parse)
+    assert cache.tree(str(included), "key", parse) is tree
+    assert len(parsed) == 1
+
+    # A new process finds the tree on disk
+    warm = TreeCache(str(tmp_path / "cache"))
+    assert warm.tree(str(included), "key", parse) == tree
+    assert warm.hits == 1 and len(parsed) == 1
+
+    # Different grammars and changed files are parsed again
+    warm.tree(str(included), "other", parse)
+    included.write_text("DefineClass @upper = /^[A-Z]$/;\n")
+    os.utime(included, ns=(0, 0))
+    upper = warm.tree(str(included), "key", parse)
+    assert len(parsed) == 3
+    # ...and the tree of the old contents is thrown away
+    entries = os.listdir(tmp_path / "cache")
+    assert sum(e.startswith("digest-") for e in entries) == 1
+    assert sum(e.startswith("tree-") for e in entries) == 2
+
+    # An edit which keeps the size and modification time is still noticed
+    included.write_text("DefineClass @upper = /^[B-Z]$/;\n")
+    os.utime(included, ns=(0, 0))
+    assert warm.tree(str(included), "key", parse) != upper
+    assert len(parsed) == 4
+
+
+def test_include_uses_tree_cache(tmp_path):
+    from fez.cache import TreeCache
+    from fez import FezParser
+    from babelfont import load
+
+    (tmp_path / "classes.fez").write_text("DefineClass @lower = /^[a-z]$/;\n")
+    font = load(os.path.join(os.path.dirname(__file__), "data", "LibertinusSans-Regular.otf"))
+    cache = TreeCache(None)
+    for _ in range(2):
+        parser = FezParser(font)
+        parser.include_cache = cache
+        parser.current_file = str(tmp_path / "main.fez")
+        parser.parseString('Include "classes.fez";')
+        assert "a" in parser.fontfeatures.namedClasses["lower"]
+    assert cache.misses == 1 and cache.hits == 1
+
+
+def test_pregenerated_parsers_are_current():
+    import json
+    import lark
+    import pytest
+    from fez.cache import PREGENERATED_DIR
+    from fez.pregenerate import MANIFEST, check
+
+    with open(os.path.join(PREGENERATED_DIR, MANIFEST)) as f:
+        version = json.load(f)["lark_version"]
+    if version != lark.__version__:
+        pytest.skip("parsers were generated with Lark %s" % version)
+    assert check() == [], "Run make parsers"
+
+
+def test_pregenerated_parsers_check_finds_drift(tmp_path):
+    import json
+    import shutil
+    from fez.cache import PREGENERATED_DIR
+    from fez.pregenerate import MANIFEST, check
+
+    shutil.copytree(PREGENERATED_DIR, tmp_path / "parsers")
+    with open(tmp_path / "parsers" / MANIFEST) as f:
+        manifest = json.load(f)
+    removed = manifest["parsers"].pop()
+    manifest["parsers"][0]["lalr"] = "0" * 64
+    with open(tmp_path / "parsers" / MANIFEST, "w") as f:
+        json.dump(manifest, f)
+    problems = check(str(tmp_path / "parsers"))
+    assert "%s: missing" % ", ".join(removed["used_by"]) in problems
+    assert "%s: changed" % ", ".join(manifest["parsers"][0]["used_by"]) in problems
+
+
+def test_pregenerated_grammar_matches_compiled():
+    import lark
+    from fez.cache import PregeneratedParsers
+
+    loaded = PregeneratedParsers().grammar(HELPERS + GRAMMAR)
+    assert loaded is not None
+    s = "Feature smcp { Substitute a -> a.sc; };"
+    assert ParserCache(None).lark(HELPERS + GRAMMAR).parse(s) == lark.Lark(loaded).parse(s)
+
+
+def test_pregenerated_lalr_parser_matches_compiled():
+    from fez import FezParser, _compile_lalr
+    from fez.cache import PregeneratedParsers
+
+    pregenerated = PregeneratedParsers().lalr(HELPERS + GRAMMAR, **FezParser.lark_kwargs)
+    compiled = _compile_lalr(ParserCache(None), HELPERS + GRAMMAR, FezParser.lark_kwargs)
+    s = "Feature smcp { Substitute a -> a.sc; };"
+    assert pregenerated.parse(s) == compiled.parse(s)
+
+
+def test_metrics_cache_measures_only_changed_glyphs(tmp_path):
+    from fez.cache import MetricsCache
+    from fez.glyphindex import GlyphIndex
+    from babelfont import load
+
+    path = os.path.join(os.path.dirname(__file__), "data", "LibertinusSans-Regular.otf")
+    cold = MetricsCache(str(tmp_path))
+    table = GlyphIndex(load(path)).metrics(cold)
+    widths = table.column("width")
+    assert cold.misses > 0 and os.listdir(tmp_path)
+
+    font = load(path)
+    font.default_master.get_glyph_layer("a").width += 10
+    warm = MetricsCache(str(tmp_path))
+    table = GlyphIndex(font).metrics(warm)
+    assert table.value("a", "width") == widths[table.index.ids["a"]] + 10
+    assert table.value("b", "width") == widths[table.index.ids["b"]]
+    assert (warm.hits, warm.misses) == (1, 1)
+
+
+def test_metrics_cache_follows_glyphtools_version(tmp_path, monkeypatch):
+    import glyphtools
+    from fez.cache import MetricsCache
+    from fez.glyphindex import GlyphIndex
+    from babelfont import load
+
+    path = os.path.join(os.path.dirname(__file__), "data", "LibertinusSans-Regular.otf")
+    cold = MetricsCache(str(tmp_path))
+    GlyphIndex(load(path)).metrics(cold).value("a", "width")
+    cold.flush()
+    monkeypatch.setattr(glyphtools, "__version__", "upgraded", raising=False)
+    cache = MetricsCache(str(tmp_path))
+    GlyphIndex(load(path)).metrics(cache).value("a", "width")
+    assert (cache.hits, cache.misses) == (0, 1)
+
+
+def test_metrics_cache_rewrites_only_changed_shards(tmp_path):
+    from fez.cache import MetricsCache
+
+    cache = MetricsCache(str(tmp_path))
+    for key in ("aa01", "aa02", "bb01"):
+        cache.put(key, {"width": 1})
+    cache.flush()
+    shards = tmp_path / ("metrics-%i" % MetricsCache.VERSION)
+    assert sorted(os.listdir(shards)) == ["aa.pickle", "bb.pickle"]
+
+    os.utime(shards / "bb.pickle", ns=(0, 0))
+    warm = MetricsCache(str(tmp_path))
+    warm.put("aa03", {"width": 3})
+    warm.flush()
+    assert (shards / "bb.pickle").stat().st_mtime_ns == 0
+    assert MetricsCache(str(tmp_path)).get("aa01") == {"width": 1}
+    assert MetricsCache(str(tmp_path)).get("aa03") == {"width": 3}
@@ -1,8 +1,9 @@
-from fez import FezParser, GlyphSelector, FEZVerb
+from fez import FezParser, FezProgram, GlyphSelector, FEZVerb, split_statements
 from babelfont import load
 import lark
 from lark import Tree, Token
 import pytest
+import io
 import os
 import re
 
@@ -147,11 +148,38 @@ def test_classdefinition_with_conjunction(parser):
     matches = set(["{}.sc".format(c) for c in "ghijklmno"])
     assert set(parser.fontfeatures.namedClasses["conjunction"]) == matches
 
+def test_classdefinition_set_algebra_keeps_font_order(parser):
+    s = """
+    DefineClass @abc = /^[a-c]$/;
+    DefineClass @union = [c b] | [x a];
+    DefineClass @difference = /^[a-f]$/ - [e b];
+    DefineClass @nested = (@abc | [z y]) & /^[c-z]$/;
+    """
+    parser.parseString(s)
+    order = parser.glyph_index.ids.__getitem__
+    for name in ["union", "difference", "nested"]:
+        glyphs = parser.fontfeatures.namedClasses[name]
+        assert isinstance(glyphs, tuple)
+        assert list(glyphs) == sorted(glyphs, key=order)
+    assert set(parser.fontfeatures.namedClasses["union"]) == set("abcx")
+    assert set(parser.fontfeatures.namedClasses["difference"]) == set("acdf")
+    assert set(parser.fontfeatures.namedClasses["nested"]) == set("cyz")
+
+
 def test_classdefinition_with_predicate(parser):
     s = r"DefineClass @foo = /\.sc$/ & (width > 500);"
     parser.parseString(s)
     assert len(parser.fontfeatures.namedClasses["foo"]) == 49
 
+def test_classdefinition_with_negated_predicates(parser):
+    s = "DefineClass @foo = rsb < 0 & not category(mark);"
+    parser.parseString(s)
+    glyphs = parser.fontfeatures.namedClasses["foo"]
+    assert glyphs
+    for g in glyphs:
+        assert parser.glyph_metrics.value(g, "rsb") < 0
+        assert parser.font.glyphs[g].category != "mark"
+
 #################
 # Substitutions #
 #################
@@ -267,3 +295,184 @@ def test_issue14(parser):
     assert alltrim(parser.fontfeatures.asFea()) == alltrim(
         "@consonants = [space exclam zero one];"
     )
+
+################
+# Lazy parsers #
+################
+def test_verb_parsers_are_lazy(parser):
+    verb = parser.plugins["ReverseSubstitute"]
+    assert "parser" not in verb.__dict__
+    parser.parseString("ReverseSubstitute a -> b;")
+    assert "parser" in verb.__dict__
+    assert "bbparser" not in verb.__dict__
+
+def test_verb_parsers_are_shared(parser):
+    parser.parseString("Substitute a -> b;")
+    compiled = parser.plugins["Substitute"].parser
+    other = FezParser(font)
+    assert other.plugins["Substitute"].parser is compiled
+
+###############
+# LALR parser #
+###############
+def test_lalr_matches_earley():
+    s = """
+    DefineClass @lower = /^[a-z]$/;
+    DefineClass @small = @lower.sc & width < 500;
+    Feature smcp { ReverseSubstitute @lower -> $1.sc; Substitute f i -> f_i; };
+    """
+    results = []
+    for lalr in (False, True):
+        parser = FezParser(font, lalr=lalr)
+        parser.parseString(s)
+        results.append((parser.fontfeatures.namedClasses["small"], alltrim(parser.fontfeatures.asFea())))
+    assert results[0] == results[1]
+
+def test_lalr_verbs():
+    import fez
+
+    parser = FezParser(None, lalr=True)
+    compiled = {"lalr": [], "earley": []}
+    for name, verb in parser.plugins.items():
+        for kind in ("parser", "bbparser", "abparser"):
+            p = getattr(verb, kind)
+            if isinstance(p, fez.FallbackParser):
+                compiled["lalr"].append((name, kind))
+            elif not isinstance(p, fez.NullParser):
+                compiled["earley"].append((name, kind))
+    assert isinstance(parser.parser, fez.FallbackParser)
+    assert sorted(compiled["lalr"]) == [
+        ("Anchors", "parser"), ("Attach", "parser"),
+        ("DefineClass", "parser"), ("DefineClassBinned", "parser"),
+        ("Feature", "bbparser"), ("Feature", "parser"), ("FeatureName", "parser"),
+        ("For", "bbparser"), ("For", "parser"),
+        ("If", "bbparser"), ("If", "parser"),
+        ("Include", "parser"), ("IncludeFEA", "parser"),
+        ("Kerning", "parser"), ("LoadAnchors", "parser"), ("LoadPlugin", "parser"),
+        ("PropagateAnchors", "parser"), ("ReverseSubstitute", "parser"),
+        ("Routine", "abparser"), ("Routine", "bbparser"), ("Routine", "parser"),
+        ("Set", "parser"),
+    ]
+    # Not LALR(1), so always parsed with Earley
+    assert sorted(compiled["earley"]) == [("Chain", "parser"), ("Position", "parser"), ("Substitute", "parser")]
+    assert {("fez.Chain", "Chain"), ("fez.Position", "Position"), ("fez.Substitute", "Substitute")} <= fez.EARLEY_ONLY
+
+def test_lalr_fallbacks_are_counted():
+    import fez
+
+    lalr = lark.Lark('start: "a"', parser="lalr")
+    fallback = fez.FallbackParser(lalr, lambda: lark.Lark('start: "b"'), ("test", "Verb"))
+    before = fez.LALR_FALLBACKS["test", "Verb"]
+    fallback.parse("a")
+    assert fez.LALR_FALLBACKS["test", "Verb"] == before
+    fallback.parse("b")
+    assert fez.LALR_FALLBACKS["test", "Verb"] == before + 1
+
+def test_single_pass_matches_two_pass():
+    s = """
+    DefineClass @lower = /^[a-z]$/;
+    DefineClass @small = @lower.sc & width < 500;
+    Feature smcp { ReverseSubstitute @lower -> $1.sc; Substitute f i -> f_i; };
+    Routine foo { Position (a <xAdvance=20>); } IgnoreMarks;
+    """
+    results = []
+    for single_pass in (False, True):
+        parser = FezParser(font, single_pass=single_pass)
+        parser.parseString(s)
+        results.append((parser.fontfeatures.namedClasses["small"], alltrim(parser.fontfeatures.asFea())))
+    assert results[0] == results[1]
+
+def test_lark_internals():
+    # Single-pass mode moves definitions between Lark grammar builders
+    # through a private attribute; see fez._grammar_definitions.
+    from lark.load_grammar import GrammarBuilder
+
+    builder = GrammarBuilder()
+    builder.load_grammar('start: NAME\nNAME: "x"', "<test>")
+    assert isinstance(getattr(builder, "_definitions", None), dict), \
+        "Lark %s has no GrammarBuilder._definitions; single-pass mode needs updating" % lark.__version__
+    assert {"start", "NAME"} <= set(builder._definitions)
+
+def test_single_pass_rebuilds_for_new_plugins():
+    parser = FezParser(font, single_pass=True)
+    before = parser.single_pass_parser
+    parser.register_plugin(BareNameModule, "BareName")
+    assert parser.single_pass_parser is not before
+    assert parser.parseString("BareName foo;") == [Token("BARENAME", "foo")]
+
+def test_split_statements():
+    s = b'''# A comment; with {braces}
+    Set $x = "a;b}";
+    Feature smcp { Substitute a -> b; };
+    Substitute c -> d; # trailing comment
+    '''
+    statements = list(split_statements(io.BytesIO(s), chunk_size=7))
+    assert [(text.strip().split(b"\n")[-1].strip(), line) for text, line, _ in statements] == [
+        (b'Set $x = "a;b}";', 1),
+        (b"Feature smcp { Substitute a -> b; };", 2),
+        (b"Substitute c -> d;", 3),
+    ]
+    assert statements[-1][2] == s.index(b"d;") + 2
+
+def test_parse_stream_matches_parse_string():
+    s = """
+    DefineClass @lower = /^[a-z]$/;
+    Feature smcp { ReverseSubstitute @lower -> $1.sc; };
+    Feature liga { Substitute f i -> f_i; };
+    """
+    parser = FezParser(font)
+    parser.parseString(s)
+    expected = alltrim(parser.fontfeatures.asFea())
+
+    parser = FezParser(font)
+    progress = []
+    stream = parser.parseStream(io.BytesIO(s.encode("utf-8")), progress=lambda done, total: progress.append(done), total=len(s))
+    next(stream)
+    assert "lower" in parser.fontfeatures.namedClasses
+    assert "smcp" not in parser.fontfeatures.features
+    list(stream)
+    assert alltrim(parser.fontfeatures.asFea()) == expected
+    assert len(progress) == 3 and progress == sorted(progress)
+
+def test_compiled_program(tmp_path):
+    s = """
+    DefineClass @lower = /^[a-z]$/;
+    Feature smcp { ReverseSubstitute @lower -> $1.sc; };
+    Feature liga { Substitute f i -> f_i; };
+    """
+    parser = FezParser(font)
+    parser.parseString(s)
+    expected = alltrim(parser.fontfeatures.asFea())
+
+    program = FezParser(None).compileString(s)
+    program.save(tmp_path / "program.fezc")
+    program = FezProgram.load(tmp_path / "program.fezc")
+    for _ in range(2):
+        assert alltrim(program.run(font).fontfeatures.asFea()) == expected
+
+def test_compiled_program_with_plugins():
+    import fez
+    from fez.cache import REGISTRY
+
+    compiler = FezParser(None)
+    compiler.load_plugin("Arabic")
+    compiler.register_plugin(BareNameModule, "BareName")
+    program = compiler.compileString("BareName foo; Feature smcp { Substitute a -> a.sc; };")
+    assert program.plugins == ["fez.Arabic", "BareNameModule"]
+    # BareNameModule cannot be imported, so has to be given as a module
+    with pytest.raises(ModuleNotFoundError):
+        program.run(font)
+    parser = program.run(font, plugins=["fez.Arabic", BareNameModule])
+    assert "smcp" in parser.fontfeatures.features
+    with pytest.raises(ValueError):
+        program.run(font, plugins=["fez.Arabic"])
+
+def test_program_key_does_not_build_parser(monkeypatch):
+    import fez
+
+    monkeypatch.setattr(fez, "_build_single_pass_parser", None)
+    parser = FezParser(None)
+    parser.register_plugin(BareNameModule, "BareName")
+    key = parser._grammar_key(True)
+    assert parser._single_pass_parser is None
+    assert FezParser(font, single_pass=True).grammar_key != key
@@ -0,0 +1,164 @@
+from fez import FezParser
+from fez.glyphindex import glyph_index
+from babelfont import Font, Glyph
+
+
+def make_font(*names):
+    font = Font()
+    for name in names:
+        font.glyphs.append(Glyph(name=name))
+    return font
+
+
+def test_index_is_shared_per_font():
+    font = make_font("a", "b")
+    index = glyph_index(font)
+    assert glyph_index(font) is index
+    assert FezParser(font).glyph_index is index
+    assert glyph_index(make_font("a", "b")) is not index
+    assert index.names == ("a", "b")
+    assert "b" in index and "c" not in index
+    assert index.ids["b"] == 1
+
+
+def test_index_follows_font_changes():
+    font = make_font("a")
+    parser = FezParser(font)
+    generation = parser.glyph_index.generation
+
+    font.glyphs.append(Glyph(name="b"))
+    assert "b" in parser.glyph_index
+    assert parser.glyph_index.generation == generation + 1
+
+    # Renaming keeps the glyph count, so verbs must say the font changed
+    font.glyphs["b"].name = "c"
+    assert "c" not in parser.glyph_index
+    parser.font_modified = True
+    assert "c" in parser.glyph_index
+    assert parser.glyph_index.generation == generation + 2
+
+    parser.parseString("DefineClass @x = /^[bc]$/;")
+    assert parser.fontfeatures.namedClasses["x"] == ["c"]
+
+
+def test_index_follows_renames_between_statements():
+    font = make_font("a", "b", "c")
+    parser = FezParser(font)
+    parser.parseString("DefineClass @x = /^[a-z]$/;")
+    generation = parser.glyph_index.generation
+
+    font.glyphs["b"].name = "d"
+    font.glyphs["c"].exported = False
+    parser.parseString("DefineClass @x = /^[a-z]$/;")
+    assert parser.fontfeatures.namedClasses["x"] == ["a", "d"]
+    assert parser.glyph_index.generation == generation + 1
+    # Nothing changed, so nothing is rebuilt
+    parser.parseString("DefineClass @y = a;")
+    assert parser.glyph_index.generation == generation + 1
+
+
+def test_regex_matching(monkeypatch):
+    import fez.glyphindex
+    import re
+
+    names = ["a", "a.sc", "b", "ba", "uni0041", "A", "f_i"]
+    patterns = [r"^a", r"a$", r"\.", r"^[ab]$", r"(?i)a", r"\Aa", r"a(?=\.)", r"[^a]", r"\b\w\b"]
+    expected = {
+        p: tuple(n for n in names if re.search(p, n)) for p in patterns
+    }
+    for threshold in (0, 1000):
+        monkeypatch.setattr(fez.glyphindex, "BATCH_THRESHOLD", threshold)
+        index = glyph_index(make_font(*names))
+        for p in patterns:
+            assert index.match(p) == expected[p]
+            assert index.match(p) is index.match(p)
+
+
+def test_unicode_range():
+    font = make_font("A", "B", "C", "alpha", "notdef")
+    for glyph, u in zip(font.glyphs, (0x41, 0x42, 0x43, 0x3B1, None)):
+        glyph.codepoints = [u] if u else []
+    index = glyph_index(font)
+    assert index.unicode_range(0x42, 0x3B1) == ("B", "C", "alpha")
+    assert index.unicode_range(0x44, 0x3B0) == ()
+    assert index.cmap[0x41] == "A"
+
+    parser = FezParser(font)
+    parser.parseString("DefineClass @caps = U+0040=>U+005A;")
+    assert parser.fontfeatures.namedClasses["caps"] == ["A", "B", "C"]
+
+
+def test_glyph_class_bitmasks():
+    from fez.glyphindex import GlyphClass
+
+    index = glyph_index(make_font(*"abcdefghij"))
+    left = GlyphClass.from_names(index, "jihc")
+    right = GlyphClass.from_names(index, "abcj")
+    assert (left | right).names == tuple("abchij")
+    assert (left & right).names == ("c", "j")
+    assert (left - right).names == ("h", "i")
+    assert len(left) == 4 and "h" in left and "a" not in left
+    assert GlyphClass.from_names(index, left) is left
+
+
+def test_glyph_class_goes_stale():
+    from fez.glyphindex import GlyphClass
+    import pytest
+
+    font = make_font(*"abcd")
+    index = glyph_index(font)
+    named = GlyphClass.from_names(index, "bd")
+    assert named.names == ("b", "d")
+    unnamed = GlyphClass.from_names(index, "ac")
+    assert unnamed.generation == index.generation
+
+    font.glyphs["a"].name = "z"
+    index.invalidate()
+    assert glyph_index(font) is index and index.names[0] == "z"
+    # Names worked out before the rebuild are still right; the masks are not
+    assert named.names == ("b", "d")
+    with pytest.raises(ValueError):
+        unnamed.names
+    with pytest.raises(ValueError):
+        named | GlyphClass.from_names(index, "z")
+    with pytest.raises(ValueError):
+        "a" in unnamed
+
+
+def test_suffix_variants():
+    index = glyph_index(make_font("a", "b", "a.sc", "c.sc", "a.sc.alt"))
+    assert index.variants("sc") == {"a": "a.sc", "c": "c.sc"}
+    assert index.apply_suffix(["a", "b"], ".", "sc") == ["a.sc", "b.sc"]
+    assert index.apply_suffix(["a.sc", "b", "x.sc"], "~", "sc") == ["a", "b", "x"]
+    assert index.apply_suffix(["a.sc.alt"], "~", "sc") == ["a.sc.alt"]
+
+    parser = FezParser(index.font)
+    parser.parseString("DefineClass @x = [a b c].sc.alt; DefineClass @y = [a.sc c.sc]~sc;")
+    assert parser.fontfeatures.namedClasses["x"] == ["a.sc.alt"]
+    assert parser.fontfeatures.namedClasses["y"] == ["a"]
+
+
+def test_substitution(monkeypatch):
+    import fez.glyphindex
+    import re
+
+    names = ["a", "a.sc", "b", "one-arab", "one-farsi", "two-arab", "f_i"]
+    cases = [(r"$", ".sc"), (r"-arab", "-farsi"), (r"^(.)", r"\1\1"), (r"[^a]", "x"), (r"x*", "-")]
+    for threshold in (0, 1000):
+        monkeypatch.setattr(fez.glyphindex, "BATCH_THRESHOLD", threshold)
+        index = glyph_index(make_font(*names))
+        for regex, replacement in cases:
+            expected = tuple(re.sub(regex, replacement, n) for n in names)
+            assert index.substitute(regex, replacement) == expected
+
+    parser = FezParser(make_font(*names))
+    parser.parseString("""
+        DefineClass @sc = hasglyph(/$/ .sc);
+        DefineClass @farsi = hasglyph(/-arab/ -farsi);
+        DefineClass @unpaired = /-arab$/ & not hasglyph(/-arab/ -farsi);
+    """)
+    classes = parser.fontfeatures.namedClasses
+    assert classes["sc"] == ("a",)
+    # Names without "-arab" are unchanged, and so name a glyph.
+    assert classes["farsi"] == ("a", "a.sc", "b", "one-arab", "one-farsi", "f_i")
+    assert classes["unpaired"] == ("two-arab",)
@@ -0,0 +1,44 @@
+import os
+import subprocess
+import sys
+
+# Modules which pull in numpy, fontTools.varLib or outline geometry, and so
+# should only be imported once a verb needs them.
+HEAVY = ["numpy", "glyphtools", "beziers", "collidoscope", "fontFeatures",
+         "fontTools.varLib", "fontTools.feaLib.variableScalar", "more_itertools"]
+
+# 'import fez' takes about 30ms here, most of it importing Lark, and took
+# 225ms before the modules above were deferred. The budget leaves room for
+# slow machines while still catching a heavy import creeping back in.
+IMPORT_BUDGET_MS = 150
+
+
+def import_times(code):
+    """Run code under ``python -X importtime``; return {module: cumulative µs}."""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True, env=env, check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_import_fez_is_light():
+    times = import_times("import fez")
+    heavy = [m for m in HEAVY if m in times]
+    assert not heavy, "import fez (%.0fms) pulled in %s" % (times["fez"] / 1000, ", ".join(heavy))
+    assert times["fez"] / 1000 < IMPORT_BUDGET_MS, "import fez took %.0fms (budget %ims)" % (
+        times["fez"] / 1000, IMPORT_BUDGET_MS
+    )
+
+
+def test_plugins_defer_geometry_imports():
+    times = import_times("import fez.IfCollides, fez.BariYe, fez.KernToDistance")
+    assert "collidoscope" not in times
@@ -0,0 +1,111 @@
+from fez import FezParser
+from babelfont import load
+from glyphtools import get_glyph_metrics
+import pytest
+
+
+@pytest.fixture
+def parser():
+    return FezParser(load("tests/data/Roboto-Regular.ttf"))
+
+
+def test_metrics_table_matches_glyphtools(parser):
+    table = parser.glyph_metrics
+    assert parser.glyph_metrics is table
+    assert table.get("a") == get_glyph_metrics(parser.font, "a")
+    assert table.value("a", "rsb") == get_glyph_metrics(parser.font, "a")["rsb"]
+    with pytest.raises(ValueError):
+        table.value("a", "height")
+
+    widths = table.column("width")
+    assert len(widths) == len(parser.glyph_index)
+    assert widths[parser.glyph_index.ids["a"]] == table.value("a", "width")
+
+
+def test_set_width_invalidates_metrics(parser):
+    table = parser.glyph_metrics
+    parser.parseString("LoadPlugin FontEngineering; SetWidth a 1000;")
+    assert parser.glyph_metrics is not table
+    assert parser.glyph_metrics.value("a", "width") == 1000
+    assert parser.glyph_metrics.column("width")[parser.glyph_index.ids["a"]] == 1000
+
+
+def two_master_font():
+    from babelfont import Axis, Font, Glyph, Layer, Master
+
+    font = Font()
+    font.axes = [Axis(name="Weight", tag="wght", min=100, max=900, default=100)]
+    font.masters = [
+        Master(name="Light", id="light", location={"wght": 100}, font=font),
+        Master(name="Bold", id="bold", location={"wght": 900}, font=font),
+    ]
+    widths = {"a": (500, 600), "b": (300, 250), "c": (700, 900)}
+    for name, (light, bold) in widths.items():
+        glyph = Glyph(name=name)
+        glyph.layers = [
+            Layer(width=light, _master="light", _font=font),
+            Layer(width=bold, _master="bold", _font=font),
+        ]
+        font.glyphs.append(glyph)
+    return font
+
+
+def test_master_tensor():
+    table = FezParser(two_master_font()).glyph_metrics
+    assert table.tensor.shape == (2, 3, 10)
+    assert list(table.column("width")) == [500, 300, 700]
+    assert list(table.column("width", "Bold")) == [600, 250, 900]
+    assert list(table.column("width", 1)) == [600, 250, 900]
+    assert table.master_columns("width").tolist() == [[500, 300, 700], [600, 250, 900]]
+    with pytest.raises(ValueError):
+        table.column("width", "Black")
+
+
+def test_master_predicates():
+    parser = FezParser(two_master_font())
+    parser.parseString("""
+        DefineClass @light = width < 550;
+        DefineClass @any = anymaster(width < 550);
+        DefineClass @all = allmasters(width < 550);
+        DefineClass @bold = master(Bold, width < 550);
+        DefineClass @notall = not allmasters(width < 550) & anymaster(width < 550);
+    """)
+    classes = parser.fontfeatures.namedClasses
+    assert classes["light"] == ("a", "b")
+    assert classes["any"] == ("a", "b")
+    assert classes["all"] == ("b",)
+    assert classes["bold"] == ("b",)
+    assert classes["notall"] == ("a",)
+
+
+def test_bin_values():
+    from fez.binning import bin_values
+
+    widths = {"a": 110, "b": 99, "c": 500, "d": 100, "e": 510, "f": 120}
+    assert bin_values(widths, 2) == [(("a", "b", "d", "f"), 107), (("c", "e"), 505)]
+    assert bin_values(widths, 1) == [(("a", "b", "c", "d", "e", "f"), 239)]
+    # Equal values share a bin, even if that makes fewer bins.
+    assert bin_values({"a": 1, "b": 2, "c": 1}, 3) == [(("a", "c"), 1), (("b",), 2)]
+    assert bin_values({}, 3) == []
+
+
+def test_binned_classes_are_shared_between_verbs():
+    parser = FezParser(two_master_font())
+    table = parser.glyph_metrics
+    assert table.bin(["a", "b", "c"], "width", 2, "min") is table.bin(("a", "b", "c"), "width", 2, "min")
+    parser.parseString("""
+        DefineClass @abc = [a b c];
+        DefineClassBinned @min[width, 2, min] = @abc;
+        DefineClassBinned @bold[width, 2, Bold] = @abc;
+    """)
+    classes = parser.fontfeatures.namedClasses
+    assert (classes["min_width1"], classes["min_width2"]) == (("b",), ("a", "c"))
+    assert (classes["bold_width1"], classes["bold_width2"]) == (("b",), ("a", "c"))
+
+    # Fewer distinct widths than bins: the extra classes are defined, empty
+    parser.parseString("""
+        DefineClassBinned @few[width, 5, min] = @abc;
+        DefineClass @few_rest = @few_width4 | @few_width5;
+    """)
+    assert [classes["few_width%i" % i] for i in range(1, 6)] == [("b",), ("a",), ("c",), (), ()]
+    assert classes["few_rest"] == ()
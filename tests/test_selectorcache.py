@@ -0,0 +1,51 @@
+from fez import FezParser, GlyphSelector
+from babelfont import Font, Glyph
+
+
+def make_parser(*names):
+    font = Font()
+    for name in names:
+        font.glyphs.append(Glyph(name=name))
+    return FezParser(font)
+
+
+def resolve(parser, selector):
+    return GlyphSelector(selector, (), None).resolve(parser.fontfeatures, parser.font)
+
+
+def test_repeated_resolution_is_cached():
+    parser = make_parser("a", "b", "c")
+    cache = parser.selector_cache
+    first = resolve(parser, {"regex": "^[ab]$"})
+    assert first == ["a", "b"]
+    # A hit, but the caller gets a list of its own
+    first.append("c")
+    assert resolve(parser, {"regex": "^[ab]$"}) == ["a", "b"]
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_cache_follows_font():
+    parser = make_parser("a", "b")
+    other = make_parser("a").font
+    selector = GlyphSelector({"regex": "^[ab]$"}, (), None)
+    assert selector.resolve(parser.fontfeatures, parser.font) == ["a", "b"]
+    assert selector.resolve(parser.fontfeatures, other) == ["a"]
+    assert parser.selector_cache.misses == 2
+
+
+def test_cache_follows_classes_glyphs_and_variables():
+    parser = make_parser("a", "b", "c")
+    parser.parseString("DefineClass @x = [a b];")
+    assert resolve(parser, {"classname": "x"}) == ["a", "b"]
+    parser.parseString("DefineClass @x = [c];")
+    assert resolve(parser, {"classname": "x"}) == ["c"]
+
+    parser.font.glyphs.append(Glyph(name="d"))
+    assert resolve(parser, {"regex": "^[cd]$"}) == ["c", "d"]
+
+    parser.parseString("""
+        For $g in [a b] {
+            DefineClass @last = $g;
+        };
+    """)
+    assert parser.fontfeatures.namedClasses["last"] == ["b"]